@@ -0,0 +1,88 @@
+"""Compare build time, read time and size of tomes for each parquet codec.
+
+    python benchmarks/parquet_codecs.py --ds-collection-root-path fixtures \
+        --channel player_vector --channel tick
+"""
+
+import argparse
+import os
+import tempfile
+import time
+
+import structlog
+
+from pureskillgg_dsdk.tome import create_tome_curator
+from pureskillgg_dsdk.tome.parquet_options import PARQUET_COMPRESSIONS
+
+HEADER_TOME_NAME = "header_tome.1234-56-78,1234-56-78"
+
+
+def main():
+    args = parse_args()
+    structlog.configure(
+        wrapper_class=structlog.make_filtering_bound_logger(40),
+    )
+    with tempfile.TemporaryDirectory() as tome_collection_root_path:
+        curator = create_tome_curator(
+            default_header_name=HEADER_TOME_NAME,
+            ds_type=args.ds_type,
+            tome_collection_root_path=tome_collection_root_path,
+            ds_collection_root_path=args.ds_collection_root_path,
+        )
+        curator.create_header_tome()
+        print(f"{'codec':<8} {'build s':>9} {'read s':>9} {'size mb':>9}")
+        for compression in args.compression or PARQUET_COMPRESSIONS:
+            result = run(curator, tome_collection_root_path, compression, args)
+            print(
+                f"{compression:<8} {result['build']:>9.2f} "
+                f"{result['read']:>9.2f} {result['size_mb']:>9.2f}"
+            )
+
+
+def run(curator, tome_collection_root_path, compression, args):
+    tome_name = f"codec_{compression}.1234-56-78,1234-56-78"
+    start_time = time.perf_counter()
+    tomer = curator.make_tome(
+        tome_name,
+        ds_reading_instructions=[{"channel": channel} for channel in args.channel],
+        max_page_row_count=args.max_page_row_count,
+        compression=compression,
+        compression_level=args.compression_level,
+        row_group_size=args.row_group_size,
+    )
+    for data, _ in tomer.iterate():
+        for channel in args.channel:
+            tomer.concat(data[channel])
+    build_time = time.perf_counter() - start_time
+
+    start_time = time.perf_counter()
+    curator.get_dataframe(tome_name)
+    read_time = time.perf_counter() - start_time
+
+    size_bytes = get_tome_size_bytes(
+        curator.get_manifest(tome_name), tome_collection_root_path
+    )
+    return {"build": build_time, "read": read_time, "size_mb": size_bytes / 1024 / 1024}
+
+
+def get_tome_size_bytes(manifest, root_path):
+    return sum(
+        os.path.getsize(os.path.join(root_path, page["dataframe"]["key"]))
+        for page in manifest["pages"]
+    )
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ds-collection-root-path", required=True)
+    parser.add_argument("--ds-type", default="csds")
+    parser.add_argument("--channel", action="append", required=True)
+    parser.add_argument("--compression", action="append", choices=PARQUET_COMPRESSIONS)
+    parser.add_argument("--compression-level", type=int, default=None)
+    parser.add_argument("--row-group-size", type=int, default=None)
+    parser.add_argument("--max-page-row-count", type=int, default=1_000_000)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    main()
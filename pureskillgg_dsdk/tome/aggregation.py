@@ -0,0 +1,102 @@
+import pandas as pd
+
+AGGREGATIONS = ["sum", "count", "mean", "min", "max", "quantile"]
+
+# Partial columns needed by each aggregation and how partials are merged
+PARTIALS = {
+    "sum": [("sum", "sum")],
+    "count": [("count", "sum")],
+    "mean": [("sum", "sum"), ("count", "sum")],
+    "min": [("min", "min")],
+    "max": [("max", "max")],
+    "quantile": [],
+}
+
+
+def parse_aggregations(aggregations):
+    """Specs (name, column, function, q) from {name: (column, function[, q])}"""
+    specs = []
+    for name, (column, function, *args) in aggregations.items():
+        if function not in AGGREGATIONS:
+            raise Exception(f"Unsupported aggregation {function}")
+        if function == "quantile" and len(args) != 1:
+            raise Exception(f"Aggregation {name} needs a quantile")
+        specs.append((name, column, function, args[0] if len(args) > 0 else None))
+    return specs
+
+
+def get_columns(by, specs):
+    return list(dict.fromkeys([*by, *[column for _, column, _, _ in specs]]))
+
+
+def get_partial(df, by, specs, *, sketch_size, rng):
+    """Per group partial aggregates of a page and samples for quantiles.
+
+    Quantiles are estimated from a bottom-k sample: every row gets a random
+    priority and each group keeps the sketch_size rows with the lowest ones,
+    which is a uniform sample of the group that can be merged.
+    """
+    groups = df.groupby(by, dropna=False, observed=True, sort=False)
+    stats = {"_rows": groups.size()}
+    for _, column, function, _ in specs:
+        for partial, _ in PARTIALS[function]:
+            stats[f"{column}:{partial}"] = getattr(groups[column], partial)()
+    samples = {}
+    for _, column, function, _ in specs:
+        if function == "quantile" and column not in samples:
+            sample = df.loc[df[column].notna(), [*by, column]]
+            sample = sample.assign(_priority=rng.random(len(sample)))
+            samples[column] = trim_sample(sample, by, sketch_size)
+    return pd.DataFrame(stats), samples
+
+
+def merge_partials(left, right, by, specs, *, sketch_size):
+    left_stats, left_samples = left
+    right_stats, right_samples = right
+    stats = (
+        pd.concat([left_stats, right_stats])
+        .groupby(level=list(range(len(by))), dropna=False, sort=False)
+        .agg(get_merges(specs))
+    )
+    samples = {
+        column: trim_sample(
+            pd.concat([sample, right_samples[column]], ignore_index=True),
+            by,
+            sketch_size,
+        )
+        for column, sample in left_samples.items()
+    }
+    return stats, samples
+
+
+def get_merges(specs):
+    merges = {"_rows": "sum"}
+    for _, column, function, _ in specs:
+        for partial, merge in PARTIALS[function]:
+            merges[f"{column}:{partial}"] = merge
+    return merges
+
+
+def get_result(partial, by, specs):
+    """Dataframe with the group columns and one column per aggregation"""
+    stats, samples = partial
+    result = pd.DataFrame(index=stats.index)
+    for name, column, function, q in specs:
+        if function == "mean":
+            result[name] = stats[f"{column}:sum"] / stats[f"{column}:count"]
+        elif function == "quantile":
+            quantiles = (
+                samples[column]
+                .groupby(by, dropna=False, observed=True)[column]
+                .quantile(q)
+            )
+            result[name] = quantiles.reindex(stats.index)
+        else:
+            result[name] = stats[f"{column}:{function}"]
+    result = result.reset_index().sort_values(by, na_position="last", kind="stable")
+    return result.reset_index(drop=True)
+
+
+def trim_sample(sample, by, sketch_size):
+    sample = sample.sort_values("_priority", kind="stable")
+    return sample.groupby(by, dropna=False, observed=True, sort=False).head(sketch_size)
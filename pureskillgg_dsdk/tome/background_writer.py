@@ -0,0 +1,101 @@
+import copy
+import queue
+import threading
+import structlog
+
+
+class TomeBackgroundWriter:
+    """Wraps a tome writer and performs its writes on a background thread.
+
+    Writes are applied in the order they are made. At most max_pending_writes
+    writes wait in the queue, after which callers block. The first error
+    raised by the wrapped writer is raised again on the next write, flush or
+    close. close stops the thread, after which writes start a new one.
+    Pages count as committed once a manifest or page log write listing them
+    is done.
+    """
+
+    def __init__(self, *, writer, max_pending_writes=2, log=None):
+        self._log = log if log is not None else structlog.get_logger()
+        self._log = self._log.bind(client="tome_background_writer")
+        self._writer = writer
+        self._queue = queue.Queue(maxsize=max_pending_writes)
+        self._thread = None
+        self._error = None
+        self._committed_pages = queue.SimpleQueue()
+
+    def set_parquet_options(self, parquet_options):
+        self._submit("set_parquet_options", copy.deepcopy(parquet_options))
+
+    def write_manifest(self, manifest):
+        self._submit("write_manifest", copy.deepcopy(manifest))
+
+    def write_manifest_page(self, manifest, page):
+        # Only the id and key are used, copying the pages would be O(pages)
+        manifest = {"id": manifest["id"], "key": manifest["key"]}
+        self._submit("write_manifest_page", manifest, copy.deepcopy(page))
+
+    def write_page(self, page, dataframe, keyset, key_rows=None):
+        self._submit("write_page", copy.deepcopy(page), dataframe, keyset, key_rows)
+
+    def write_key_index(self, key_index, df):
+        self._submit("write_key_index", copy.deepcopy(key_index), df)
+
+    def flush(self):
+        """Wait for all pending writes to finish"""
+        self._queue.join()
+        self._raise_if_failed()
+
+    def pop_committed_pages(self):
+        """Numbers of the pages committed since the last call"""
+        numbers = []
+        while not self._committed_pages.empty():
+            numbers.append(self._committed_pages.get())
+        return numbers
+
+    def close(self):
+        """Finish all pending writes and stop the background thread"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self._raise_if_failed()
+
+    def _submit(self, method, *args):
+        self._raise_if_failed()
+        self._start()
+        self._queue.put((method, args))
+
+    def _start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._work, daemon=True)
+        self._thread.start()
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                self._queue.task_done()
+                return
+            method, args = item
+            try:
+                if self._error is None:
+                    getattr(self._writer, method)(*args)
+                    self._on_written(method, args)
+            except Exception as err:  # pylint: disable=broad-exception-caught
+                self._log.error("Background Write: Failed", method=method)
+                self._error = err
+            finally:
+                self._queue.task_done()
+
+    def _on_written(self, method, args):
+        if method == "write_manifest_page":
+            self._committed_pages.put(args[1]["number"])
+        if method == "write_manifest":
+            for page in args[0]["pages"]:
+                self._committed_pages.put(page["number"])
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
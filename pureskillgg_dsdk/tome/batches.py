@@ -0,0 +1,85 @@
+import pyarrow as pa
+
+
+def shuffle_batches(
+    tables,
+    *,
+    batch_size,
+    shuffle_buffer_rows,
+    rng,
+    drop_last=False,
+    interleave_pages=1,
+):
+    """Yield Arrow tables of batch_size rows, shuffled across several pages.
+
+    Tables are opened (each shuffled) until at least interleave_pages of them
+    and shuffle_buffer_rows rows are open. Each batch is a uniform sample of
+    the rows left in all open tables, so batches mix pages even when a page
+    is larger than the buffer. With a buffer of 0 rows the rows are batched
+    in order.
+    """
+    if shuffle_buffer_rows <= 0:
+        yield from iterate_ordered_batches(tables, batch_size, drop_last)
+        return
+    tables = iter(tables)
+    pages = []
+    buffer_rows = max(shuffle_buffer_rows, batch_size)
+    while True:
+        open_pages(pages, tables, rng, interleave_pages, buffer_rows)
+        left = [table.num_rows - position for table, position in pages]
+        row_count = min(batch_size, sum(left))
+        if row_count == 0 or (drop_last and row_count < batch_size):
+            return
+        parts = []
+        for page, count in zip(pages, rng.multivariate_hypergeometric(left, row_count)):
+            table, position = page
+            parts.append(table.slice(position, count))
+            page[1] = position + count
+        pages[:] = [page for page in pages if page[1] < page[0].num_rows]
+        yield shuffle(pa.concat_tables(parts, promote_options="permissive"), rng)
+
+
+def open_pages(pages, tables, rng, interleave_pages, buffer_rows):
+    """Open shuffled tables until enough pages and rows are open"""
+    while (
+        len(pages) < interleave_pages
+        or sum(table.num_rows - position for table, position in pages) < buffer_rows
+    ):
+        table = next(tables, None)
+        if table is None:
+            return
+        if table.num_rows > 0:
+            pages.append([shuffle(table, rng), 0])
+
+
+def iterate_ordered_batches(tables, batch_size, drop_last):
+    buffer = None
+    for table in tables:
+        buffer = concat(buffer, table)
+        while buffer.num_rows >= batch_size:
+            yield buffer.slice(0, batch_size)
+            buffer = buffer.slice(batch_size)
+    if buffer is None or buffer.num_rows == 0 or drop_last:
+        return
+    yield buffer
+
+
+def concat(buffer, table):
+    if buffer is None:
+        return table
+    return pa.concat_tables([buffer, table], promote_options="permissive")
+
+
+def shuffle(table, rng):
+    return table.take(rng.permutation(table.num_rows))
+
+
+def to_batch_format(table, batch_format):
+    if batch_format == "arrow":
+        return table.combine_chunks().to_batches()[0]
+    if batch_format == "numpy":
+        return {
+            name: column.to_numpy()
+            for name, column in zip(table.column_names, table.columns)
+        }
+    raise Exception(f"Unsupported batch format {batch_format}")
@@ -0,0 +1,177 @@
+import os
+import structlog
+import pandas as pd
+
+DTYPES = {
+    "key": "object",
+    "date_path": "object",
+    "size": "int64",
+    "mtime": "int64",
+    "date_path_mtime": "int64",
+}
+
+# Levels searched for YYYY/MM/DD date directories below the root
+MAX_DATE_PATH_DEPTH = 6
+
+
+class DsCollectionIndex:
+    """Index of the ds manifests in a collection on disk.
+
+    The collection is laid out as ds_type/YYYY/MM/DD/match_id/ds_type. Date
+    directories are found by their YYYY/MM/DD names at any depth, or are
+    exactly partition_depth levels below the root when it is given. The index
+    stores the key, date directory, size and mtime of every manifest in a
+    parquet file beside the collection. A refresh only lists the match
+    directories of date directories whose mtime changed, since adding or
+    removing a match changes the mtime of its date directory.
+    """
+
+    # pylint: disable=too-many-arguments
+    def __init__(
+        self,
+        *,
+        root_path,
+        ds_type="csds",
+        index_path=None,
+        partition_depth=None,
+        log=None,
+    ):
+        self._log = log if log is not None else structlog.get_logger()
+        self._log = self._log.bind(
+            client="ds_collection_index", root_path=root_path, ds_type=ds_type
+        )
+        self._root_path = root_path
+        self._ds_type = ds_type
+        self._index_path = (
+            index_path
+            if index_path is not None
+            else os.path.join(root_path, f".{ds_type}_collection_index.parquet")
+        )
+        self._partition_depth = partition_depth
+        self._df = None
+
+    @property
+    def index_path(self):
+        return self._index_path
+
+    def get_dataframe(self):
+        """The index, refreshed on first use"""
+        if self._df is None:
+            self.refresh()
+        return self._df
+
+    def get_manifest_keys(self):
+        """Sorted manifest keys in the collection"""
+        return list(self.get_dataframe()["key"])
+
+    def refresh(self, full=False):
+        """Rescan changed date directories (all with full=True) and save"""
+        previous = self._read() if not full else empty_index()
+        previous_mtimes = dict(zip(previous["date_path"], previous["date_path_mtime"]))
+
+        date_paths = self._list_date_paths()
+        if len(date_paths) == 0:
+            raise Exception(
+                f"No YYYY/MM/DD date directories found in {self._root_path}"
+            )
+        changed = [
+            (date_path, mtime)
+            for date_path, mtime in date_paths
+            if previous_mtimes.get(date_path) != mtime
+        ]
+        unchanged = previous[
+            previous["date_path"].isin([path for path, _ in date_paths])
+            & ~previous["date_path"].isin([path for path, _ in changed])
+        ]
+        dfs = [self._scan_date_path(date_path, mtime) for date_path, mtime in changed]
+        dfs = [df for df in [unchanged, *dfs] if len(df) > 0]
+        df = pd.concat(dfs, ignore_index=True) if len(dfs) > 0 else empty_index()
+        df = df.sort_values("key", kind="stable").reset_index(drop=True)
+        self._log.info(
+            "Refresh Index: Done",
+            rescanned=len(changed),
+            date_path_count=len(date_paths),
+            key_count=len(df),
+        )
+        if len(changed) > 0 or len(df) != len(previous):
+            self._write(df)
+        self._df = df
+        return df
+
+    def _list_date_paths(self):
+        if self._partition_depth is None:
+            paths = self._find_date_paths()
+        else:
+            paths = [""]
+            for _ in range(self._partition_depth):
+                paths = [
+                    child for path in paths for child in self._list_subdirectories(path)
+                ]
+        return sorted(
+            (path, os.stat(os.path.join(self._root_path, path)).st_mtime_ns)
+            for path in paths
+        )
+
+    def _find_date_paths(self):
+        date_paths = []
+        paths = [""]
+        for _ in range(MAX_DATE_PATH_DEPTH):
+            paths = [
+                child for path in paths for child in self._list_subdirectories(path)
+            ]
+            date_paths += [path for path in paths if is_date_path(path)]
+            # Match directories below a date directory are not searched
+            paths = [path for path in paths if not is_date_path(path)]
+        return date_paths
+
+    def _list_subdirectories(self, path):
+        return [
+            join_key(path, entry.name)
+            for entry in scandir(os.path.join(self._root_path, path))
+            if entry.is_dir() and not entry.name.startswith(".")
+        ]
+
+    def _scan_date_path(self, date_path, mtime):
+        rows = []
+        for entry in scandir(os.path.join(self._root_path, date_path)):
+            if not entry.is_dir():
+                continue
+            key = join_key(date_path, entry.name, self._ds_type)
+            try:
+                stat = os.stat(os.path.join(self._root_path, key))
+            except FileNotFoundError:
+                continue
+            rows.append((key, date_path, stat.st_size, stat.st_mtime_ns, mtime))
+        return pd.DataFrame(rows, columns=list(DTYPES)).astype(DTYPES)
+
+    def _read(self):
+        if not os.path.exists(self._index_path):
+            return empty_index()
+        return pd.read_parquet(self._index_path)
+
+    def _write(self, df):
+        # Write to a temporary file first so readers never see a partial index
+        temp_path = f"{self._index_path}.tmp"
+        df.to_parquet(temp_path, index=False)
+        os.replace(temp_path, self._index_path)
+
+
+def scandir(path):
+    with os.scandir(path) as entries:
+        return list(entries)
+
+
+def is_date_path(path):
+    """True if the last parts of path look like YYYY/MM/DD"""
+    parts = path.split("/")[-3:]
+    return len(parts) == 3 and all(
+        part.isdigit() and len(part) == length for part, length in zip(parts, [4, 2, 2])
+    )
+
+
+def join_key(*parts):
+    return "/".join(part for part in parts if part != "")
+
+
+def empty_index():
+    return pd.DataFrame(columns=list(DTYPES)).astype(DTYPES)
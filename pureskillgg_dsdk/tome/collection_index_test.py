@@ -0,0 +1,70 @@
+# pylint: disable=missing-docstring
+import os
+import shutil
+import pytest
+from .collection_index import DsCollectionIndex
+from .header_tome import get_manifest_key_paths_from_glob
+
+# pylint: disable=invalid-name
+fixtures_path = "fixtures"
+day_path = os.path.join("csds", "2022", "05", "15")
+
+
+class CountingIndex(DsCollectionIndex):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.scanned = []
+
+    def _scan_date_path(self, date_path, mtime):
+        self.scanned.append(date_path)
+        return super()._scan_date_path(date_path, mtime)
+
+
+def copy_match(root_path, match_id, date_path=day_path):
+    shutil.copytree(
+        os.path.join(fixtures_path, day_path, match_id),
+        os.path.join(root_path, date_path, match_id),
+    )
+
+
+def test_collection_index(tmp_path):
+    root_path = str(tmp_path)
+    match_ids = sorted(os.listdir(os.path.join(fixtures_path, day_path)))
+    other_day_path = os.path.join("csds", "2022", "05", "16")
+    copy_match(root_path, match_ids[0])
+    copy_match(root_path, match_ids[1], other_day_path)
+
+    index = CountingIndex(root_path=root_path)
+    assert index.get_manifest_keys() == get_manifest_key_paths_from_glob(
+        root_path, "csds"
+    )
+    assert os.path.exists(index.index_path)
+    assert index.scanned == ["csds/2022/05/15", "csds/2022/05/16"]
+
+    copy_match(root_path, match_ids[2])
+    index = CountingIndex(root_path=root_path)
+    keys = index.get_manifest_keys()
+    assert index.scanned == ["csds/2022/05/15"]
+    assert keys == get_manifest_key_paths_from_glob(root_path, "csds")
+    assert len(keys) == 3
+
+    index.refresh(full=True)
+    assert index.scanned == ["csds/2022/05/15", "csds/2022/05/15", "csds/2022/05/16"]
+
+
+def test_collection_index_finds_date_directories(tmp_path):
+    root_path = str(tmp_path)
+    match_ids = sorted(os.listdir(os.path.join(fixtures_path, day_path)))
+    copy_match(root_path, match_ids[0])
+    ds_type_path = os.path.join(root_path, "csds")
+
+    keys = DsCollectionIndex(root_path=ds_type_path).get_manifest_keys()
+
+    assert keys == get_manifest_key_paths_from_glob(ds_type_path, "csds")
+    assert keys == [f"2022/05/15/{match_ids[0]}/csds"]
+
+
+def test_collection_index_without_date_directories(tmp_path):
+    os.makedirs(os.path.join(tmp_path, "csds", "matches"))
+    with pytest.raises(Exception, match="No YYYY/MM/DD date directories"):
+        DsCollectionIndex(root_path=str(tmp_path)).get_manifest_keys()
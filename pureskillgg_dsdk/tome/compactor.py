@@ -0,0 +1,250 @@
+import structlog
+import pandas as pd
+
+from .loader import TomeLoader
+from .scribe import TomeScribe
+from .manifest import TomeManifest, now_to_iso
+from .storage import create_tome_writer, create_tome_reader
+from .header_tome import DEFAULT_MAX_PAGE_ROW_COUNT
+
+# Keys with one row each (e.g. header tomes) are passed to the scribe in runs
+MAX_RUN_ROW_COUNT = 1024
+
+
+# pylint: disable=too-many-locals
+def compact_tome_from_fs(
+    name,
+    *,
+    tome_collection_root_path="tomes",
+    ds_type="csds",
+    max_page_size_mb=None,
+    max_page_row_count=DEFAULT_MAX_PAGE_ROW_COUNT,
+    sort_by=None,
+    remove_replaced_pages=True,
+    log=None,
+):
+    """
+    Rewrite a complete tome into pages of the given size.
+
+    The new pages are written as the next generation beside the current
+    ones, and the manifest is only replaced once all of them are written,
+    so readers see either the old or the new tome. The rows of a key stay
+    together. With sort_by, keys are ordered by the values of their first
+    row (within each partition). Keys are copied one output page at a time,
+    reading each source page that page needs once, so the source pages of
+    one output page are held in memory together.
+    """
+    log = log if log is not None else structlog.get_logger()
+    src_reader = create_tome_reader(
+        tome_collection_root_path,
+        manifest_key="/".join(["tome", ds_type, name, "tome"]),
+        log=log,
+    )
+    src_loader = TomeLoader(reader=src_reader, log=log)
+    src_manifest = src_loader.manifest
+    if not src_manifest["isComplete"]:
+        raise Exception("Only complete tomes can be compacted")
+    src_pages = {page["number"]: page for page in src_manifest["pages"]}
+
+    chunks = get_chunks(src_loader.get_key_index(), src_pages)
+    if sort_by is not None:
+        chunks = sort_chunks(chunks, src_reader, src_pages, sort_by)
+
+    manifest = TomeManifest(
+        tome_name=name,
+        ds_type=src_manifest["dsType"],
+        is_header=src_manifest["isHeader"],
+        header_tome_name=src_manifest["headerTomeName"],
+        src_id=src_manifest["sourceId"],
+        partition_by=src_manifest.get("partitionBy"),
+        parquet_options=src_manifest.get("parquet"),
+        generation=src_manifest.get("generation", 0) + 1,
+        log=log,
+    )
+    # Still the same tome, only its pages change
+    manifest.set(
+        {
+            **manifest.get(),
+            "id": src_manifest["id"],
+            "createdAt": src_manifest["createdAt"],
+            "compactedAt": now_to_iso(),
+        }
+    )
+    writer = create_tome_writer(
+        tome_collection_root_path,
+        parquet_options=src_manifest.get("parquet"),
+        log=log,
+    )
+    scribe = TomeScribe(
+        manifest=manifest,
+        writer=writer,
+        max_page_size_mb=max_page_size_mb,
+        max_page_row_count=max_page_row_count,
+        defer_manifest=True,
+        log=log,
+    )
+
+    log.info(
+        "Compact Tome: Start",
+        tome_name=name,
+        src_page_count=len(src_pages),
+        key_count=len(chunks),
+    )
+    max_run_row_count = min(MAX_RUN_ROW_COUNT, max_page_row_count or MAX_RUN_ROW_COUNT)
+
+    def read_page(page_number):
+        return src_reader.read_page_dataframe(src_pages[page_number])
+
+    scribe.start()
+    for run, df in iterate_run_frames(
+        iterate_runs(chunks, max_run_row_count),
+        read_page,
+        max_page_row_count or DEFAULT_MAX_PAGE_ROW_COUNT,
+    ):
+        keys, _, _, _, partition, key_rows = run
+        scribe.concat(df, keys, partition=partition, key_rows=key_rows)
+    scribe.finish()
+    log.info("Compact Tome: Done", tome_name=name, page_count=scribe.page_counter)
+
+    if remove_replaced_pages:
+        writer.remove_entries(
+            [
+                page[subtype]
+                for page in src_pages.values()
+                for subtype in ["dataframe", "keyset"]
+            ]
+            + [src_manifest["keyIndex"]]
+        )
+
+    reader = create_tome_reader(
+        tome_collection_root_path,
+        manifest_key=manifest.get()["key"],
+        log=log,
+    )
+    return TomeLoader(reader=reader, log=log)
+
+
+def get_chunks(key_index, pages):
+    """One row per range of rows in the tome, with the keys that share it"""
+    if key_index["row_start"].isna().any():
+        raise Exception("Tome pages have no row ranges, remake the tome")
+    chunks = (
+        key_index.groupby(["page", "row_start", "row_stop"], sort=False)["key"]
+        .agg(list)
+        .reset_index()
+    )
+    return pd.DataFrame(
+        {
+            "_keys": chunks["key"],
+            "_page": chunks["page"].astype(int),
+            "_row_start": chunks["row_start"].astype(int),
+            "_row_stop": chunks["row_stop"].astype(int),
+            "_partition": chunks["page"].map(
+                lambda number: pages[number].get("partition")
+            ),
+        }
+    )
+
+
+def sort_chunks(chunks, reader, pages, sort_by):
+    """Order chunks by partition and the sort_by values of their first row"""
+    values = []
+    for page_number, page_chunks in chunks.groupby("_page", sort=False):
+        page_chunks = page_chunks[page_chunks["_row_stop"] > page_chunks["_row_start"]]
+        df = reader.read_page_dataframe(pages[page_number], columns=sort_by)
+        values.append(
+            df.iloc[page_chunks["_row_start"].to_numpy()].set_axis(
+                page_chunks.index, axis=0
+            )
+        )
+    # Keys without rows have no values and go last
+    chunks = chunks.join(pd.concat(values)[sort_by])
+    chunks = chunks.sort_values(
+        ["_partition", *sort_by], kind="stable", na_position="last"
+    )
+    return chunks.reset_index(drop=True)
+
+
+def iterate_runs(chunks, max_run_row_count):
+    """Yield chunks, joining consecutive one row keys of a page into runs.
+
+    Each run comes with the row range of each of its keys within the run.
+    """
+    run = None
+    for chunk in chunks[
+        ["_keys", "_page", "_row_start", "_row_stop", "_partition"]
+    ].itertuples(index=False, name=None):
+        if run is not None and can_extend_run(run, chunk, max_run_row_count):
+            run = join_run(run, chunk)
+            continue
+        if run is not None:
+            yield run
+        keys, _, row_start, row_stop, _ = chunk
+        run = (list(keys), *chunk[1:], [(0, row_stop - row_start)] * len(keys))
+    if run is not None:
+        yield run
+
+
+def iterate_run_frames(runs, read_page, window_row_count):
+    """Yield each run with its rows, copying about one output page at a time.
+
+    Every source page a window of runs needs is read once and the pages of
+    the previous window are kept, so runs in sort_by order do not read a
+    source page for every key.
+    """
+    pages = {}
+    window = []
+    row_count = 0
+    for run in runs:
+        window.append(run)
+        row_count += run[3] - run[2]
+        if row_count >= window_row_count:
+            pages = read_window_pages(window, read_page, pages)
+            yield from iterate_window(window, pages)
+            window = []
+            row_count = 0
+    pages = read_window_pages(window, read_page, pages)
+    yield from iterate_window(window, pages)
+
+
+def read_window_pages(window, read_page, previous_pages):
+    page_numbers = dict.fromkeys(run[1] for run in window)
+    return {
+        number: (
+            previous_pages[number] if number in previous_pages else read_page(number)
+        )
+        for number in page_numbers
+    }
+
+
+def iterate_window(window, pages):
+    for run in window:
+        _, page_number, row_start, row_stop, _, _ = run
+        yield run, pages[page_number].iloc[row_start:row_stop]
+
+
+def join_run(run, chunk):
+    keys, page_number, row_start, _, partition, key_rows = run
+    chunk_rows = (chunk[2] - row_start, chunk[3] - row_start)
+    return (
+        keys + chunk[0],
+        page_number,
+        row_start,
+        chunk[3],
+        partition,
+        key_rows + [chunk_rows] * len(chunk[0]),
+    )
+
+
+def can_extend_run(run, chunk, max_run_row_count):
+    run_keys, run_page_number, run_start, run_stop, run_partition, _ = run
+    keys, page_number, row_start, row_stop, partition = chunk
+    return (
+        run_stop - run_start < max_run_row_count
+        and len(run_keys) == run_stop - run_start
+        and len(keys) == 1
+        and row_stop - row_start == 1
+        and page_number == run_page_number
+        and row_start == run_stop
+        and partition == run_partition
+    )
@@ -0,0 +1,122 @@
+# pylint: disable=missing-docstring
+import os
+import pytest
+import pandas as pd
+from .curator import TomeCuratorFs
+from .compactor import iterate_run_frames
+
+# pylint: disable=invalid-name
+default_header_name = "header_tome.1234-56-78,1234-56-78"
+tome_name = "round_end_compacted.1234-56-78,1234-56-78"
+
+
+def create_paged_tome(tmp_path, max_page_row_count=1):
+    curator = TomeCuratorFs(
+        default_header_name=default_header_name,
+        ds_type="csds",
+        tome_collection_root_path=tmp_path,
+        ds_collection_root_path="fixtures",
+    )
+    curator.create_header_tome()
+    tomer = curator.make_tome(
+        tome_name,
+        ds_reading_instructions=[{"channel": "round_end"}],
+        max_page_row_count=max_page_row_count,
+    )
+    for data, _ in tomer.iterate():
+        tomer.concat(data["round_end"])
+    return curator
+
+
+def test_compact_tome(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_paged_tome(tmp_path)
+    manifest = curator.get_manifest(tome_name)
+    df = curator.get_dataframe(tome_name)
+    keyset = curator.get_keyset(tome_name)
+    assert len(manifest["pages"]) == 3
+
+    loader = curator.compact_tome(tome_name, max_page_row_count=12)
+
+    compacted = loader.manifest
+    row_counts = [page["statistics"]["rowCount"] for page in compacted["pages"]]
+    assert len(row_counts) == 2
+    assert max(row_counts) <= 12
+    assert compacted["id"] == manifest["id"]
+    assert compacted["generation"] == 1
+    assert "generation_00001" in compacted["pages"][0]["dataframe"]["key"]
+    pd.testing.assert_frame_equal(loader.get_dataframe(), df)
+    assert loader.get_keyset() == keyset
+    pd.testing.assert_frame_equal(
+        loader.get_rows_for_keys(keyset[2:]),
+        df.iloc[len(df) - row_counts[1] :].reset_index(drop=True),
+    )
+    for page in manifest["pages"]:
+        assert not os.path.exists(os.path.join(tmp_path, page["dataframe"]["key"]))
+    assert not os.path.exists(os.path.join(tmp_path, manifest["keyIndex"]["key"]))
+
+    loader = curator.compact_tome(tome_name, max_page_row_count=100)
+    assert loader.manifest["generation"] == 2
+    assert len(loader.manifest["pages"]) == 1
+    pd.testing.assert_frame_equal(loader.get_dataframe(), df)
+
+
+def test_compact_tome_sort_by(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_paged_tome(tmp_path, max_page_row_count=None)
+    loader = curator.get_loader(tome_name)
+    rows = {key: loader.get_rows_for_keys([key]) for key in loader.get_keyset()}
+    first_values = {key: df["value"].iloc[0] for key, df in rows.items()}
+
+    loader = curator.compact_tome(tome_name, sort_by=["value"])
+
+    keyset = loader.get_keyset()
+    assert keyset == sorted(first_values, key=first_values.get)
+    for key in keyset:
+        pd.testing.assert_frame_equal(loader.get_rows_for_keys([key]), rows[key])
+
+
+def test_compact_header_tome(tmp_path):
+    curator = create_paged_tome(str(tmp_path))
+    df = curator.get_dataframe(default_header_name)
+
+    loader = curator.compact_tome(default_header_name, sort_by=["map_name"])
+
+    assert loader.get_keyset() == list(df.sort_values("map_name")["key"])
+    assert loader.get_rows_for_keys(list(df["key"]))["key"].tolist() == list(df["key"])
+
+
+def test_compact_partial_tome(tmp_path):
+    curator = create_paged_tome(str(tmp_path))
+    tomer = curator.make_tome(
+        "partial.1234-56-78,1234-56-78",
+        ds_reading_instructions=[{"channel": "round_end"}],
+        max_page_row_count=1,
+    )
+    for data, _ in tomer.iterate():
+        tomer.concat(data["round_end"])
+        break
+    with pytest.raises(Exception, match="Only complete tomes can be compacted"):
+        curator.compact_tome("partial.1234-56-78,1234-56-78")
+
+
+def test_iterate_run_frames_reads_pages_once_per_window():
+    # One row keys of three pages in an order that alternates pages
+    runs = [
+        ([f"key_{page}_{row}"], page, row, row + 1, None, [(0, 1)])
+        for row in range(4)
+        for page in range(3)
+    ]
+    reads = []
+
+    def read_page(page_number):
+        reads.append(page_number)
+        return pd.DataFrame({"x": [page_number * 10 + row for row in range(4)]})
+
+    frames = list(iterate_run_frames(runs, read_page, 6))
+
+    assert reads == [0, 1, 2]
+    assert [run for run, _ in frames] == runs
+    assert [df["x"].tolist() for _, df in frames] == [
+        [page * 10 + row] for row in range(4) for page in range(3)
+    ]
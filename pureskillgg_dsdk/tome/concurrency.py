@@ -0,0 +1,45 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+
+def map_ordered(fn, items, workers):
+    """Like map, but runs fn in a pool of workers processes when workers > 1.
+
+    Results are yielded in the order of items. The pool is shut down when
+    the results are exhausted or the consumer stops iterating.
+    """
+    if workers <= 1:
+        yield from map(fn, items)
+        return
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=get_context("spawn")
+    ) as executor:
+        yield from imap_ordered(executor, fn, items, 2 * workers)
+
+
+def add_log_option(options, log, workers):
+    """Add log to the options of a function passed to map_ordered"""
+    if workers <= 1:
+        # Worker processes create their own logger
+        options["log"] = log
+    return options
+
+
+def imap_ordered(executor, fn, items, max_pending):
+    """Like executor.map, but only keeps max_pending items in flight.
+
+    Results are yielded in the order of items. Pending work is cancelled
+    when the consumer stops iterating early.
+    """
+    futures = deque()
+    try:
+        for item in items:
+            futures.append(executor.submit(fn, item))
+            if len(futures) >= max_pending:
+                yield futures.popleft().result()
+        while len(futures) > 0:
+            yield futures.popleft().result()
+    finally:
+        for future in futures:
+            future.cancel()
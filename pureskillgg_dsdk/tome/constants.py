@@ -8,6 +8,56 @@ def get_page_path_fs(path, subtype, page):
     return os.path.join(path, page[subtype]["key"])
 
 
+def get_page_key_s3(prefix, subtype, page):
+    return add_s3_prefix(page[subtype]["key"], prefix)
+
+
+def add_s3_prefix(key, prefix, /) -> str:
+    if prefix is None:
+        return key
+    return "/".join([prefix.strip("/"), key])
+
+
+def is_s3_path(path):
+    return str(path).startswith("s3://")
+
+
+def parse_s3_path(path):
+    """Split s3://bucket/prefix into the bucket and the prefix (or None)"""
+    bucket, _, prefix = str(path)[len("s3://") :].partition("/")
+    prefix = prefix.strip("/")
+    return bucket, prefix if prefix != "" else None
+
+
+def get_key_rows(keyset_df):
+    df = keyset_df.rename(columns={keyset_df.columns[0]: "key"})
+    for column in ["row_start", "row_stop"]:
+        if column not in df.columns:
+            df[column] = None
+    return df[["key", "row_start", "row_stop"]]
+
+
+def get_page_log_key(manifest_key):
+    return f"{manifest_key}.pages"
+
+
+def create_page_log_entry(manifest, page):
+    return {"id": manifest["id"], "page": page}
+
+
+def merge_page_log(manifest, entries):
+    """Add the pages logged after the manifest was last written.
+
+    Entries of other builds (a different manifest id) are ignored.
+    """
+    pages = {page["number"]: page for page in manifest["pages"]}
+    for entry in entries:
+        page = entry["page"]
+        if entry["id"] == manifest["id"] and page["number"] >= len(manifest["pages"]):
+            pages[page["number"]] = page
+    return {**manifest, "pages": [pages[number] for number in sorted(pages)]}
+
+
 def filter_ds_reader_logs(_, __, event_dict):
     if event_dict.get("client") == "ds_reader_fs":
         raise structlog.DropEvent
@@ -24,6 +74,27 @@ def make_key(my_list):
     return "/".join([arg for arg in my_list if valid_key_part(arg)])
 
 
+MATCH_DATE_COLUMN = "match_date"
+
+
+def get_date_filters(start_date=None, end_date=None):
+    """pyarrow filters for match dates between start_date and end_date inclusive"""
+    filters = []
+    if start_date is not None:
+        filters.append((MATCH_DATE_COLUMN, ">=", str(start_date)))
+    if end_date is not None:
+        filters.append((MATCH_DATE_COLUMN, "<=", str(end_date)))
+    return filters if len(filters) > 0 else None
+
+
+def get_key_date(key):
+    """Match date as yyyy-mm-dd from the yyyy/mm/dd part of a manifest key"""
+    match = re.search(r"(?:^|/)(\d{4})/(\d{2})/(\d{2})(?:/|$)", key)
+    if match is None:
+        return None
+    return "-".join(match.groups())
+
+
 def warn_if_invalid_tome_name(tome_name):
     if not re.match(r"\S+.\d{4}-\d{2}-\d{2},\d{4}-\d{2}-\d{2}[.\S]*", tome_name):
         warnings.warn(
@@ -5,16 +5,24 @@ from typing import List
 import structlog
 import pandas as pd
 
-from .header_tome import create_header_tome_from_fs, create_subheader_tome_from_fs
+from .header_tome import (
+    DEFAULT_MAX_PAGE_ROW_COUNT,
+    create_header_tome_from_fs,
+    create_subheader_tome_from_fs,
+)
 
 from .loader import TomeLoader
 from .scribe import TomeScribe
 from .manifest import TomeManifest
 from .maker import TomeMaker
-from .writer_fs import TomeWriterFs
-from .reader_fs import TomeReaderFs
+from .fan_out_maker import TomeFanOutMaker
+from .storage import create_tome_writer, create_tome_reader
+from .parquet_options import create_parquet_options, DEFAULT_CLUSTER_ROW_GROUP_SIZE
+from .compactor import compact_tome_from_fs
+from .deriver import derive_tome_from_fs
 from .header_copier_fs import HeaderTomeCopierFs
-from .constants import warn_if_invalid_tome_name
+from .constants import is_s3_path, warn_if_invalid_tome_name
+from .journal import TomeJournalFs
 
 from ..ds_io import ChannelInstruction, DsReaderFs, GameDsLoader
 
@@ -30,7 +38,8 @@ class TomeCuratorFs:
     ds_type : str, default=from env (PURESKILLGG_TOME_DS_TYPE)
         Type of data science file to read from `ds_collection_root_path`.
     tome_collection_root_path : str, default=from env (PURESKILLGG_TOME_COLLECTION_PATH)
-        Path leading to where tomes will be stored.
+        Path leading to where tomes will be stored. Use `s3://bucket/prefix`
+        to store tomes in S3.
     ds_collection_root_path : str, default=from env (PURESKILLGG_TOME_DS_COLLECTION_PATH)
         Path leading to a series of (possibly nested) folders containing game Data Science files.
     log : structlog.stdlib.BoundLogger
@@ -63,7 +72,17 @@ class TomeCuratorFs:
         )
 
     def create_header_tome(
-        self, tome_name: str = None, /, *, path_depth=None
+        self,
+        tome_name: str = None,
+        /,
+        *,
+        path_depth=None,
+        workers: int = 1,
+        incremental: bool = False,
+        use_collection_index: bool = False,
+        max_page_size_mb: float = None,
+        max_page_row_count: int = DEFAULT_MAX_PAGE_ROW_COUNT,
+        partition_by_date: bool = False,
     ) -> TomeLoader:
         """
         Create the header tome.
@@ -74,6 +93,22 @@ class TomeCuratorFs:
             Name of the header that will be created.
         path depth : int, default=4
             DEPRECATED. Please do not use. Search is recursive.
+        workers : int, default=1
+            Number of processes that read the header channels.
+        incremental : bool, default=False
+            If the header tome exists, only read the matches missing from it
+            and append them as new pages.
+        use_collection_index : bool, default=False
+            List matches from the collection index stored beside the ds
+            collection, rescanning only changed date directories, instead of
+            searching the whole collection.
+        max_page_size_mb : float, default=None
+            Maximum page size in megabytes.
+        max_page_row_count : int, default=100000
+            Maximum number of rows per page.
+        partition_by_date : bool, default=False
+            Add a match_date column from the match keys and write each date
+            to separate pages, so date ranges only read matching pages.
 
         Returns
         -------
@@ -91,6 +126,12 @@ class TomeCuratorFs:
             ds_type=self._ds_type,
             tome_collection_root_path=self._tome_collection_root_path,
             ds_collection_root_path=self._ds_collection_root_path,
+            workers=workers,
+            incremental=incremental,
+            use_collection_index=use_collection_index,
+            max_page_size_mb=max_page_size_mb,
+            max_page_row_count=max_page_row_count,
+            partition_by_date=partition_by_date,
             log=self._log,
         )
 
@@ -101,6 +142,10 @@ class TomeCuratorFs:
         /,
         *,
         src_tome_name: str = None,
+        max_page_size_mb: float = None,
+        max_page_row_count: int = DEFAULT_MAX_PAGE_ROW_COUNT,
+        start_date: str = None,
+        end_date: str = None,
     ) -> TomeLoader:
         """
         Create a subheader tome.
@@ -110,12 +155,21 @@ class TomeCuratorFs:
         tome_name : str, default=`default_header_name`
             Name of the header that will be created.
         selector : callable, default=lambda to select all rows
-            The selector is passed directly through to the header
-            dataframe and the final subheader tome will be equal to
-            `header_dataframe.loc[selector]`.
+            The selector is passed directly through to each page of the
+            header dataframe and the final subheader tome will be equal to
+            `header_dataframe.loc[selector]` when the selector only uses the
+            values of each row.
         src_tome_name : str, default=`default_header_name`
             Source header file. Should be the same as the
             default header name in most cases.
+        max_page_size_mb : float, default=None
+            Maximum page size in megabytes.
+        max_page_row_count : int, default=100000
+            Maximum number of rows per page.
+        start_date : str, default=None
+            Only keep matches on or after this date (yyyy-mm-dd).
+        end_date : str, default=None
+            Only keep matches on or before this date (yyyy-mm-dd).
 
         Returns
         -------
@@ -131,10 +185,123 @@ class TomeCuratorFs:
             src_tome_name=src_name,
             selector=selector,
             tome_collection_root_path=self._tome_collection_root_path,
+            max_page_size_mb=max_page_size_mb,
+            max_page_row_count=max_page_row_count,
+            start_date=start_date,
+            end_date=end_date,
+            log=self._log,
+        )
+
+    def compact_tome(
+        self,
+        tome_name: str,
+        /,
+        *,
+        max_page_size_mb: float = None,
+        max_page_row_count: int = DEFAULT_MAX_PAGE_ROW_COUNT,
+        sort_by: List[str] = None,
+        remove_replaced_pages: bool = True,
+    ) -> TomeLoader:
+        """
+        Rewrite a complete tome into evenly sized pages.
+
+        Parameters
+        ----------
+        tome_name : str
+            Name of the tome.
+        max_page_size_mb : float, default=None
+            Maximum page size *in memory* in megabytes.
+        max_page_row_count : int, default=100000
+            Maximum number of rows per page.
+        sort_by : list of str, default=None
+            Order the keys by these columns of their first row. The rows of
+            a key always stay together.
+        remove_replaced_pages : bool, default=True
+            Remove the old pages once the new manifest is written. Readers
+            that loaded the old manifest can no longer read its pages.
+
+        Returns
+        -------
+        TomeLoader
+            Loader for the compacted tome.
+        """
+        return compact_tome_from_fs(
+            tome_name,
+            ds_type=self._ds_type,
+            tome_collection_root_path=self._tome_collection_root_path,
+            max_page_size_mb=max_page_size_mb,
+            max_page_row_count=max_page_row_count,
+            sort_by=sort_by,
+            remove_replaced_pages=remove_replaced_pages,
+            log=self._log,
+        )
+
+    def derive_tome(
+        self,
+        src_tome_name: str,
+        tome_name: str,
+        fn: callable,
+        /,
+        *,
+        columns: List[str] = None,
+        workers: int = 1,
+        behavior_if_complete: str = "pass",
+        behavior_if_partial: str = "continue",
+    ) -> TomeLoader:
+        """
+        Make a tome from the pages of another tome.
+
+        Parameters
+        ----------
+        src_tome_name : str
+            Name of the complete tome to read.
+        tome_name : str
+            Name of the tome that will be created.
+        fn : callable
+            Function called as `fn(df, keyset)` for every page of the source
+            tome. It must return a dataframe and be picklable when
+            `workers > 1`. When it returns as many rows as it was given,
+            the keys keep their row ranges.
+        columns : list of str, default=None
+            Only read these columns of the source pages.
+        workers : int, default=1
+            Number of processes that call `fn`. Pages are still written in
+            order, one page for each source page.
+        behavior_if_complete : str, default="pass"
+            What to do when the tome is complete: pass, overwrite or fail.
+        behavior_if_partial : str, default="continue"
+            What to do when the tome is partial: continue after its last
+            page, overwrite or fail.
+
+        Returns
+        -------
+        TomeLoader
+            Loader for the derived tome.
+        """
+        warn_if_invalid_tome_name(tome_name)
+        return derive_tome_from_fs(
+            src_tome_name,
+            tome_name,
+            fn,
+            ds_type=self._ds_type,
+            tome_collection_root_path=self._tome_collection_root_path,
+            columns=columns,
+            workers=workers,
+            behavior_if_complete=behavior_if_complete,
+            behavior_if_partial=behavior_if_partial,
             log=self._log,
         )
 
-    def get_dataframe(self, tome_name: str) -> pd.DataFrame:
+    def get_dataframe(
+        self,
+        tome_name: str,
+        /,
+        *,
+        columns: List[str] = None,
+        filters: list = None,
+        max_workers: int = 1,
+        as_arrow: bool = False,
+    ) -> pd.DataFrame:
         """
         Get the dataframe from a tome.
 
@@ -142,6 +309,15 @@ class TomeCuratorFs:
         ----------
         tome_name : str
             Name of the tome.
+        columns : list of str, default=None
+            Only read these columns. Default value of None reads all columns.
+        filters : list, default=None
+            Only read rows matching these pyarrow filters,
+            e.g. `[("map_name", "==", "de_dust2")]`.
+        max_workers : int, default=1
+            Number of threads reading pages.
+        as_arrow : bool, default=False
+            Return a `pyarrow.Table` instead of a pandas dataframe.
 
         Returns
         -------
@@ -149,7 +325,9 @@ class TomeCuratorFs:
             Pandas dataframe containing the tome's data.
         """
         loader = self.get_loader(tome_name)
-        return loader.get_dataframe()
+        return loader.get_dataframe(
+            columns=columns, filters=filters, max_workers=max_workers, as_arrow=as_arrow
+        )
 
     def get_keyset(self, tome_name: str) -> list:
         """
@@ -185,7 +363,15 @@ class TomeCuratorFs:
         loader = self.get_loader(tome_name)
         return loader.manifest
 
-    def iterate_pages(self, tome_name: str) -> TomeLoader.iterate_pages:
+    def iterate_pages(
+        self,
+        tome_name: str,
+        /,
+        *,
+        columns: List[str] = None,
+        filters: list = None,
+        prefetch: int = 0,
+    ) -> TomeLoader.iterate_pages:
         """
         Iterate through pages of a tome.
 
@@ -193,6 +379,12 @@ class TomeCuratorFs:
         ----------
         tome_name : str
             Name of the tome.
+        columns : list of str, default=None
+            Only read these columns. Default value of None reads all columns.
+        filters : list, default=None
+            Only read rows matching these pyarrow filters.
+        prefetch : int, default=0
+            Number of upcoming pages to read on a background thread.
 
         Returns
         -------
@@ -200,7 +392,114 @@ class TomeCuratorFs:
             Iterator for pages from TomeLoader.
         """
         loader = self.get_loader(tome_name)
-        return loader.iterate_pages()
+        return loader.iterate_pages(columns=columns, filters=filters, prefetch=prefetch)
+
+    def iter_batches(
+        self,
+        tome_name: str,
+        /,
+        *,
+        batch_size: int,
+        shuffle_buffer_rows: int = 0,
+        columns: List[str] = None,
+        seed: int = None,
+        batch_format: str = "numpy",
+        drop_last: bool = False,
+        prefetch: int = 1,
+        interleave_pages: int = 4,
+    ) -> TomeLoader.iter_batches:
+        """
+        Iterate through fixed size batches of rows of a tome.
+
+        Parameters
+        ----------
+        tome_name : str
+            Name of the tome.
+        batch_size : int
+            Number of rows in each batch.
+        shuffle_buffer_rows : int, default=0
+            Shuffle pages and rows through a buffer of this many rows.
+            Default value of 0 yields rows in tome order.
+        columns : list of str, default=None
+            Only read these columns. Default value of None reads all columns.
+        seed : int, default=None
+            Seed for the shuffle. Use a different seed for each epoch.
+        batch_format : str, default="numpy"
+            Either "numpy" for dicts of NumPy arrays or "arrow" for Arrow
+            record batches.
+        drop_last : bool, default=False
+            Skip the last batch if it has fewer than batch_size rows.
+        prefetch : int, default=1
+            Number of upcoming pages to read on a background thread.
+        interleave_pages : int, default=4
+            Minimum number of pages whose rows are mixed in each batch when
+            shuffling.
+
+        Returns
+        -------
+        TomeLoader.iter_batches
+            Iterator for batches from TomeLoader.
+        """
+        loader = self.get_loader(tome_name)
+        return loader.iter_batches(
+            batch_size,
+            shuffle_buffer_rows,
+            columns,
+            seed,
+            batch_format=batch_format,
+            drop_last=drop_last,
+            prefetch=prefetch,
+            interleave_pages=interleave_pages,
+        )
+
+    def aggregate(
+        self,
+        tome_name: str,
+        by: List[str],
+        aggregations: dict,
+        /,
+        *,
+        filters: list = None,
+        max_workers: int = 1,
+        sketch_size: int = 1024,
+        seed: int = 0,
+    ) -> pd.DataFrame:
+        """
+        Group-by aggregation over a tome, one page at a time.
+
+        Parameters
+        ----------
+        tome_name : str
+            Name of the tome.
+        by : list of str
+            Columns to group by.
+        aggregations : dict
+            Output column names mapped to `(column, function)` with function
+            one of sum, count, mean, min or max, or to
+            `(column, "quantile", q)`.
+        filters : list, default=None
+            Only aggregate rows that match, in the pyarrow filter format.
+        max_workers : int, default=1
+            Number of threads reading and reducing pages.
+        sketch_size : int, default=1024
+            Rows sampled per group to estimate quantiles.
+        seed : int, default=0
+            Seed of the quantile samples.
+
+        Returns
+        -------
+        pd.DataFrame
+            The group columns and one column per aggregation.
+        """
+        loader = self.get_loader(tome_name)
+        return loader.aggregate(
+            by,
+            aggregations,
+            filters=filters,
+            max_workers=max_workers,
+            sketch_size=sketch_size,
+            seed=seed,
+        )
 
     def get_loader(self, tome_name: str) -> TomeLoader:
         """
@@ -216,8 +515,8 @@ class TomeCuratorFs:
         TomeLoader
             The TomeLoader instance for this tome.
         """
-        reader = TomeReaderFs(
-            root_path=self._tome_collection_root_path,
+        reader = create_tome_reader(
+            self._tome_collection_root_path,
             manifest_key="/".join(["tome", self._ds_type, tome_name, "tome"]),
             log=self._log,
         )
@@ -255,9 +554,7 @@ class TomeCuratorFs:
             else self.get_loader(subheader_name)
         )
 
-        keyset = loader.get_keyset()
-
-        index = random.choice(range(0, len(keyset)))
+        index = random.randrange(loader.row_count)
         return self.get_match_by_index(index, subheader_name)
 
     def get_match_by_index(
@@ -284,11 +581,11 @@ class TomeCuratorFs:
             else self.get_loader(subheader_name)
         )
 
-        df_header = loader.get_dataframe()
+        row = loader.get_row(index, columns=["key"])
 
         csds_reader = DsReaderFs(
             root_path=self._ds_collection_root_path,
-            manifest_key=df_header["key"][index],
+            manifest_key=row["key"],
         )
 
         csds_loader = GameDsLoader(reader=csds_reader)
@@ -305,7 +602,16 @@ class TomeCuratorFs:
         ds_reading_instructions: List[ChannelInstruction] = None,
         max_page_size_mb: float = None,
         max_page_row_count: int = None,
-        limit_check_frequency: int = 100,
+        limit_check_frequency: int = 1,
+        workers: int = 1,
+        map_fn: callable = None,
+        background_write: bool = False,
+        journal: bool = False,
+        compression: str = "gzip",
+        compression_level: int = None,
+        row_group_size: int = None,
+        use_dictionary: bool = True,
+        cluster_by: List[str] = None,
         **kwargs,
     ) -> TomeMaker:
         """
@@ -319,15 +625,49 @@ class TomeCuratorFs:
             Instructions on how to read in each DS file. Default value
             of None will read all channels and columns.
         max_page_size_mb : float, default = None
-            Max size *in memory* that a tome can be. Generally it will be
+            Max size *in memory* that a page can be. Generally it will be
             2-10x smaller on disk. By default the scribe will not check.
+            A page only exceeds the limit when a single key is larger.
         max_page_row_count : int, default = None
-            Max number of rows that a tome can be. By default it will
+            Max number of rows that a page can be. By default it will
             not have a max row count.
-        limit_check_frequency : int
-            How often the scribe should check if it exceeded the max size or
-            max row count. This should be a multiple of the print frequency
-            which is set to 100.
+        limit_check_frequency : int, default = 1
+            How often (in keys) the scribe should check if it reached the
+            max size or max row count. Checks use running totals and are
+            cheap, so every key is checked by default.
+        workers : int, default = 1
+            Number of processes used to read matches (and run `map_fn`).
+            Results are still passed to the scribe in keyset order.
+        map_fn : callable, default = None
+            Function called as `map_fn(data, key)` for every match, where
+            `data` is the dict of channel dataframes. It must return a
+            dataframe (or None) and be picklable when `workers > 1`.
+            Call `TomeMaker.run` to make the tome with it.
+        background_write : bool, default = False
+            Encode and write finished pages on a background thread while
+            the next page is filled. Write errors are raised on the next
+            page write or when the tome is finished.
+        journal : bool, default = False
+            Write the data of every key to a journal beside the tome, so
+            keys of a page that was not written yet are restored instead of
+            read again when the build is continued.
+        compression : str, default = "gzip"
+            Parquet codec of the pages: gzip, zstd, lz4, snappy or none.
+            zstd and lz4 write and decode much faster than gzip.
+        compression_level : int, default = None
+            Level of the codec. By default the codec's own default is used.
+        row_group_size : int, default = None
+            Max number of rows in a parquet row group. By default a page
+            is written as one row group (up to 1M rows), or in row groups
+            of 10,000 rows with `cluster_by`.
+        use_dictionary : bool, default = True
+            Dictionary encode columns of the pages.
+        cluster_by : list of str, default = None
+            Order the keys within each page by these columns of their first
+            row, which helps compression and lets row group statistics skip
+            data on filtered reads. Pages are not reordered, so use
+            `compact_tome(sort_by=...)` for selective page statistics. The
+            rows of a key stay together and in order.
         **kwargs:
             Keywords passed through to the TomeMaker.
 
@@ -347,14 +687,25 @@ class TomeCuratorFs:
         existing_tome_loader = self.get_loader(name)
 
         header_loader = self.get_loader(header_name)
-        writer = TomeWriterFs(
-            root_path=self._tome_collection_root_path,
+        if cluster_by is not None and row_group_size is None:
+            # A page in one row group has the same statistics in any order
+            row_group_size = DEFAULT_CLUSTER_ROW_GROUP_SIZE
+        parquet_options = create_parquet_options(
+            compression=compression,
+            compression_level=compression_level,
+            row_group_size=row_group_size,
+            use_dictionary=use_dictionary,
+        )
+        writer = create_tome_writer(
+            self._tome_collection_root_path,
+            parquet_options=parquet_options,
             log=self._log,
         )
         manifest = TomeManifest(
             tome_name=name,
             ds_type=self._ds_type,
             header_tome_name=header_name,
+            parquet_options=parquet_options,
             log=self._log,
         )
         scribe = TomeScribe(
@@ -363,6 +714,9 @@ class TomeCuratorFs:
             max_page_size_mb=max_page_size_mb,
             max_page_row_count=max_page_row_count,
             limit_check_frequency=limit_check_frequency,
+            background_write=background_write,
+            cluster_by=cluster_by,
+            journal=self._create_journal(name) if journal else None,
             log=self._log,
         )
         header_copier = HeaderTomeCopierFs(
@@ -381,12 +735,70 @@ class TomeCuratorFs:
             ds_collection_root_path=self._ds_collection_root_path,
             tome_loader=existing_tome_loader,
             header_copier=header_copier,
+            workers=workers,
+            map_fn=map_fn,
             **kwargs,
             log=self._log,
         )
 
         return tomer
 
+    def make_tomes(
+        self,
+        tomes: dict,
+        /,
+        *,
+        workers: int = 1,
+    ) -> TomeFanOutMaker:
+        """
+        Make several tomes reading every match only once.
+
+        Parameters
+        ----------
+        tomes : dict
+            Tome names mapped to the options of each tome. `map_fn` is
+            required and called as `map_fn(data, key)` with only the
+            channels and columns in the tome's `ds_reading_instructions`.
+            Other options are passed to `make_tome`, so every tome has its
+            own paging, header and resume behavior.
+        workers : int, default = 1
+            Number of processes used to read matches and run the map_fns.
+
+        Returns
+        -------
+        TomeFanOutMaker
+            Call `run` to make the tomes.
+        """
+        makers = {}
+        map_fns = {}
+        for name, options in tomes.items():
+            options = dict(options)
+            if "map_fn" not in options:
+                raise Exception(f"Tome {name} has no map_fn")
+            map_fns[name] = options.pop("map_fn")
+            makers[name] = self.make_tome(name, **options)
+        return TomeFanOutMaker(
+            makers=makers,
+            map_fns=map_fns,
+            ds_collection_root_path=self._ds_collection_root_path,
+            workers=workers,
+            log=self._log,
+        )
+
+    def _create_journal(self, tome_name):
+        if is_s3_path(self._tome_collection_root_path):
+            raise Exception("Tome journals are only supported on the filesystem")
+        return TomeJournalFs(
+            path=os.path.join(
+                self._tome_collection_root_path,
+                "tome",
+                self._ds_type,
+                tome_name,
+                "journal",
+            ),
+            log=self._log,
+        )
+
 
 def get_env_option(name, value):
     if value is not None:
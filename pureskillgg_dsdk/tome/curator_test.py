@@ -3,8 +3,10 @@
 # pylint: disable=unused-argument
 import os
 import itertools
+import shutil
 import pytest
 import pandas as pd
+import pyarrow.parquet as pq
 from .curator import TomeCuratorFs
 
 # pylint: disable=invalid-name
@@ -14,6 +16,7 @@ default_header_name = "header_tome.1234-56-78,1234-56-78"
 sub_header_name = "only_good_headers.1234-56-78,1234-56-78"
 new_tome_name = "round_end.1234-56-78,1234-56-78"
 continued_tome_name = "round_end_continued.1234-56-78,1234-56-78"
+new_tome_name_parallel = "round_end_parallel.1234-56-78,1234-56-78"
 pd.DataFrame()
 
 
@@ -53,6 +56,56 @@ def test_create_header_tome(tmp_path):
     assert isinstance(manifest, dict)
 
 
+def test_create_header_tome_workers(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_curator_instance(tmp_path)
+    create_header(curator)
+    loader = curator.create_header_tome(
+        "header_parallel.1234-56-78,1234-56-78", workers=2
+    )
+
+    df = loader.get_dataframe()
+    expected = curator.get_dataframe(default_header_name)
+    assert list(df["key"]) == sorted(df["key"])
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_create_header_tome_incremental(tmp_path):
+    ds_path = os.path.join(tmp_path, "ds")
+    tome_path = os.path.join(tmp_path, "tomes")
+    day_path = os.path.join(ds_type, "2022", "05", "15")
+    match_ids = sorted(os.listdir(os.path.join(ds_collection_root_path, day_path)))
+    for match_id in match_ids[:2]:
+        shutil.copytree(
+            os.path.join(ds_collection_root_path, day_path, match_id),
+            os.path.join(ds_path, day_path, match_id),
+        )
+    curator = TomeCuratorFs(
+        default_header_name=default_header_name,
+        ds_type=ds_type,
+        tome_collection_root_path=tome_path,
+        ds_collection_root_path=ds_path,
+    )
+    first = curator.create_header_tome(use_collection_index=True)
+    shutil.copytree(
+        os.path.join(ds_collection_root_path, day_path, match_ids[2]),
+        os.path.join(ds_path, day_path, match_ids[2]),
+    )
+
+    loader = curator.create_header_tome(incremental=True, use_collection_index=True)
+
+    assert loader.is_complete
+    assert loader.manifest["id"] == first.manifest["id"]
+    assert len(loader.manifest["pages"]) == 2
+    assert list(loader.get_key_index()["page"]) == [0, 0, 1]
+    assert loader.get_keyset() == [
+        os.path.join(day_path, match_id, ds_type) for match_id in match_ids
+    ]
+    assert curator.create_header_tome(incremental=True).manifest["pages"] == (
+        loader.manifest["pages"]
+    )
+
+
 def test_create_subheader_tome(tmp_path):
     tmp_path = str(tmp_path)
     curator = create_curator_instance(tmp_path)
@@ -228,6 +281,73 @@ def test_make_tome_complete_behavior_overwrite(tmp_path):
     assert tome_id != curator.get_manifest(continued_tome_name)["id"]
 
 
+def test_create_header_tomes_paged(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_curator_instance(tmp_path)
+    header = curator.create_header_tome(max_page_row_count=1)
+    subheader = curator.create_subheader_tome(
+        sub_header_name,
+        lambda df: df["key"]
+        != "csds/2022/05/15/63cc7181-07c9-42fd-ade4-4eeb2cf4db6f/csds",
+        max_page_row_count=1,
+    )
+
+    assert len(header.manifest["pages"]) == 3
+    assert len(subheader.manifest["pages"]) == 2
+    keys = header.get_keyset()
+    assert subheader.get_keyset() == [keys[0], keys[2]]
+    assert list(subheader.get_dataframe()["key"]) == [keys[0], keys[2]]
+
+
+def test_create_subheader_tome_splits_large_source_pages(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_curator_instance(tmp_path)
+    header = curator.create_header_tome()
+    subheader = curator.create_subheader_tome(
+        sub_header_name, lambda df: df["key"].notna(), max_page_row_count=2
+    )
+
+    assert len(header.manifest["pages"]) == 1
+    assert [page["statistics"]["rowCount"] for page in subheader.manifest["pages"]] == [
+        2,
+        1,
+    ]
+    assert subheader.get_keyset() == header.get_keyset()
+    pd.testing.assert_frame_equal(subheader.get_dataframe(), header.get_dataframe())
+    keys = header.get_keyset()
+    assert list(subheader.get_rows_for_keys(keys[1:2])["key"]) == keys[1:2]
+
+
+def test_create_header_tomes_partitioned_by_date(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_curator_instance(tmp_path)
+
+    header = curator.create_header_tome(partition_by_date=True)
+    subheader = curator.create_subheader_tome(
+        sub_header_name, start_date="2022-05-15", end_date="2022-05-15"
+    )
+
+    assert header.manifest["partitionBy"] == "match_date"
+    assert [page["partition"] for page in header.manifest["pages"]] == ["2022-05-15"]
+    assert list(header.get_dataframe()["match_date"]) == ["2022-05-15"] * 3
+    assert subheader.get_keyset() == header.get_keyset()
+    assert subheader.manifest["pages"][0]["partition"] == "2022-05-15"
+    with pytest.raises(Exception):
+        curator.create_subheader_tome(sub_header_name, start_date="2022-05-16")
+
+
+def test_create_subheader_tome_date_range(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_curator_instance(tmp_path)
+    create_header(curator)
+
+    loader = curator.create_subheader_tome(sub_header_name, start_date="2022-05-15")
+
+    assert len(loader.get_keyset()) == 3
+    with pytest.raises(Exception):
+        curator.create_subheader_tome(sub_header_name, end_date="2022-05-14")
+
+
 def test_get_random_match(tmp_path):
     tmp_path = str(tmp_path)
     curator = create_curator_instance(tmp_path)
@@ -239,3 +359,288 @@ def test_get_random_match(tmp_path):
     data = loader.get_channels()
 
     assert len(manifest["channels"]) == len(data)
+
+
+def test_get_match_by_index(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_curator_instance(tmp_path)
+    create_header_and_subheader(curator)
+
+    keys = curator.get_dataframe(default_header_name, columns=["key"])["key"]
+    loader = curator.get_match_by_index(len(keys) - 1)
+
+    assert loader.manifest["key"] == keys.iloc[-1]
+
+
+def round_end_map_fn(data, key):
+    df = data["round_end"]
+    df["key"] = key
+    return df
+
+
+def test_make_tome_with_map_fn(tmp_path):
+    curator = create_curator_instance(tmp_path)
+    create_header_and_subheader(curator)
+
+    tomer = curator.make_tome(
+        new_tome_name,
+        header_tome_name=sub_header_name,
+        ds_reading_instructions=[{"channel": "round_end"}],
+    )
+    for data, key in tomer.iterate():
+        tomer.concat(round_end_map_fn(data, key))
+    expected = curator.get_dataframe(new_tome_name)
+
+    tomer = curator.make_tome(
+        new_tome_name_parallel,
+        header_tome_name=sub_header_name,
+        ds_reading_instructions=[{"channel": "round_end"}],
+        max_page_row_count=1,
+        workers=2,
+        map_fn=round_end_map_fn,
+    )
+    tomer.run()
+
+    df = curator.get_dataframe(new_tome_name_parallel)
+    keyset = curator.get_keyset(new_tome_name_parallel)
+    assert keyset == curator.get_keyset(new_tome_name)
+    assert list(df["key"]) == list(expected["key"])
+    assert curator.get_manifest(new_tome_name_parallel)["isComplete"] is True
+
+
+def test_make_tome_continue_from_journal(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_curator_instance(tmp_path)
+    create_header(curator)
+    keys = curator.get_keyset(default_header_name)
+    mapped_keys = []
+
+    def failing_map_fn(data, key):
+        if key == keys[2]:
+            raise OSError("preempted")
+        mapped_keys.append(key)
+        return round_end_map_fn(data, key)
+
+    def map_fn(data, key):
+        mapped_keys.append(key)
+        return round_end_map_fn(data, key)
+
+    options = {
+        "ds_reading_instructions": [{"channel": "round_end"}],
+        "journal": True,
+    }
+    with pytest.raises(OSError):
+        curator.make_tome(new_tome_name, map_fn=failing_map_fn, **options).run()
+    assert curator.get_manifest(new_tome_name)["pages"] == []
+
+    curator.make_tome(new_tome_name, map_fn=map_fn, **options).run()
+
+    assert mapped_keys == keys
+    assert curator.get_keyset(new_tome_name) == keys
+    df = curator.get_dataframe(new_tome_name)
+    assert list(df["key"].unique()) == keys
+    assert not os.path.exists(
+        os.path.join(tmp_path, "tome", ds_type, new_tome_name, "journal")
+    )
+
+
+def test_make_tome_continue_from_journal_with_incomplete_key(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_curator_instance(tmp_path)
+    create_header(curator)
+    keys = curator.get_keyset(default_header_name)
+    options = {
+        "ds_reading_instructions": [{"channel": "round_end"}],
+        "journal": True,
+    }
+
+    tomer = curator.make_tome(new_tome_name, **options)
+    for data, key in tomer.iterate():
+        tomer.concat(data["round_end"].iloc[:1])
+        if key == keys[1]:
+            # Crash before the rest of the key is added
+            break
+        tomer.concat(data["round_end"].iloc[1:])
+
+    tomer = curator.make_tome(new_tome_name, **options)
+    read_keys = []
+    for data, key in tomer.iterate():
+        read_keys.append(key)
+        tomer.concat(data["round_end"].iloc[:1])
+        tomer.concat(data["round_end"].iloc[1:])
+
+    assert read_keys == keys[1:]
+    tomer = curator.make_tome(new_tome_name_parallel, **options)
+    for data, key in tomer.iterate():
+        tomer.concat(data["round_end"])
+    pd.testing.assert_frame_equal(
+        curator.get_dataframe(new_tome_name),
+        curator.get_dataframe(new_tome_name_parallel),
+    )
+
+
+def test_get_dataframe_with_columns_and_filters(tmp_path):
+    curator = create_curator_instance(tmp_path)
+    create_header(curator)
+
+    key = "csds/2022/05/15/63cc7181-07c9-42fd-ade4-4eeb2cf4db6f/csds"
+    df = curator.get_dataframe(
+        default_header_name,
+        columns=["key", "match_id"],
+        filters=[("key", "==", key)],
+    )
+    assert list(df.columns) == ["key", "match_id"]
+    assert list(df["key"]) == [key]
+
+    pages = list(curator.iterate_pages(default_header_name, columns=["key"]))
+    assert [list(df.columns) for df, _ in pages] == [["key"]]
+
+
+def test_get_dataframe_with_threads(tmp_path):
+    curator = create_curator_instance(tmp_path)
+    create_header_and_subheader(curator)
+    tomer = curator.make_tome(
+        new_tome_name,
+        header_tome_name=sub_header_name,
+        ds_reading_instructions=[{"channel": "round_end"}],
+        max_page_row_count=1,
+    )
+    for data, _ in tomer.iterate():
+        tomer.concat(data["round_end"])
+
+    pages = [df for df, _ in curator.iterate_pages(new_tome_name)]
+    expected = pd.concat(pages, ignore_index=True)
+    df = curator.get_dataframe(new_tome_name, max_workers=4)
+    table = curator.get_dataframe(new_tome_name, max_workers=4, as_arrow=True)
+
+    assert len(pages) == 2
+    pd.testing.assert_frame_equal(df, expected)
+    assert table.num_rows == len(expected)
+
+
+def test_get_rows_for_keys(tmp_path):
+    curator = create_curator_instance(tmp_path)
+    create_header_and_subheader(curator)
+    tomer = curator.make_tome(
+        new_tome_name,
+        header_tome_name=sub_header_name,
+        ds_reading_instructions=[{"channel": "round_end"}],
+        max_page_row_count=1,
+    )
+    expected = {}
+    for data, key in tomer.iterate():
+        expected[key] = data["round_end"]
+        tomer.concat(data["round_end"])
+    keys = list(reversed(curator.get_keyset(new_tome_name)))
+
+    loader = curator.get_loader(new_tome_name)
+    df = loader.get_rows_for_keys(keys)
+    pd.testing.assert_frame_equal(
+        df, pd.concat([expected[key] for key in keys], ignore_index=True)
+    )
+    df = loader.get_rows_for_keys(keys[:1], columns=["tick"])
+    assert list(df.columns) == ["tick"]
+    assert len(df) == len(expected[keys[0]])
+    assert len(loader.get_rows_for_keys(["missing"])) == 0
+
+
+def test_get_rows_for_keys_partial_tome(tmp_path):
+    curator = create_curator_instance(tmp_path)
+    create_partial_tome(curator)
+    loader = curator.get_loader(continued_tome_name)
+    keyset = loader.get_keyset()
+
+    assert "keyIndex" not in loader.manifest
+    assert len(loader.get_rows_for_keys(keyset)) == len(loader.get_dataframe())
+
+
+def test_key_index_after_continue(tmp_path):
+    curator = create_curator_instance(tmp_path)
+    create_partial_tome(curator)
+    tomer = continue_tomer_generator(curator)
+    for data, _ in tomer.iterate():
+        tomer.concat(data["round_end"])
+
+    loader = curator.get_loader(continued_tome_name)
+    assert "keyIndex" in loader.manifest
+    assert list(loader.get_key_index()["key"]) == loader.get_keyset()
+    assert list(loader.get_key_index()["page"]) == [0, 1]
+
+
+def get_page_parquet_metadata(tmp_path, manifest, page_number):
+    page = manifest["pages"][page_number]
+    return pq.ParquetFile(os.path.join(tmp_path, page["dataframe"]["key"])).metadata
+
+
+def test_make_tome_parquet_options(tmp_path):
+    tmp_path = str(tmp_path)
+    curator = create_curator_instance(tmp_path)
+    create_header_and_subheader(curator)
+
+    tomer = curator.make_tome(
+        continued_tome_name,
+        header_tome_name=sub_header_name,
+        ds_reading_instructions=[{"channel": "round_end"}],
+        max_page_row_count=1,
+        compression="zstd",
+        compression_level=3,
+        row_group_size=2,
+    )
+    for data, _ in tomer.iterate():
+        tomer.concat(data["round_end"])
+        break
+
+    manifest = curator.get_manifest(continued_tome_name)
+    assert manifest["parquet"]["compression"] == "zstd"
+    assert curator.get_loader(continued_tome_name).parquet_options == {
+        "compression": "zstd",
+        "compressionLevel": 3,
+        "rowGroupSize": 2,
+        "useDictionary": True,
+    }
+    metadata = get_page_parquet_metadata(tmp_path, manifest, 0)
+    assert metadata.row_group(0).column(0).compression == "ZSTD"
+    assert metadata.num_row_groups == -(-metadata.num_rows // 2)
+
+    # A continued tome keeps the options it was started with
+    tomer = continue_tomer_generator(curator)
+    for data, _ in tomer.iterate():
+        tomer.concat(data["round_end"])
+
+    manifest = curator.get_manifest(continued_tome_name)
+    metadata = get_page_parquet_metadata(tmp_path, manifest, 1)
+    assert manifest["parquet"]["compression"] == "zstd"
+    assert metadata.row_group(0).column(0).compression == "ZSTD"
+    assert len(curator.get_dataframe(continued_tome_name)) > 0
+
+
+def test_make_tome_unsupported_compression(tmp_path):
+    curator = create_curator_instance(str(tmp_path))
+    with pytest.raises(Exception, match="Unsupported parquet compression"):
+        curator.make_tome(new_tome_name, compression="brotli")
+
+
+def test_make_tome_cluster_by(tmp_path):
+    curator = create_curator_instance(str(tmp_path))
+    create_header_and_subheader(curator)
+    for name, cluster_by in [(new_tome_name, None), (continued_tome_name, ["value"])]:
+        tomer = curator.make_tome(
+            name,
+            ds_reading_instructions=[{"channel": "round_end"}],
+            cluster_by=cluster_by,
+        )
+        for data, _ in tomer.iterate():
+            tomer.concat(data["round_end"])
+
+    loader = curator.get_loader(new_tome_name)
+    clustered_loader = curator.get_loader(continued_tome_name)
+    keyset = loader.get_keyset()
+    first_values = {
+        key: loader.get_rows_for_keys([key])["value"].iloc[0] for key in keyset
+    }
+    assert clustered_loader.get_keyset() == sorted(keyset, key=first_values.get)
+    assert clustered_loader.parquet_options["rowGroupSize"] == 10_000
+    assert loader.parquet_options["rowGroupSize"] is None
+    pd.testing.assert_frame_equal(
+        clustered_loader.get_rows_for_keys(keyset), loader.get_rows_for_keys(keyset)
+    )
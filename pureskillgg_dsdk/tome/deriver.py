@@ -0,0 +1,169 @@
+from contextlib import closing
+from functools import partial
+import structlog
+import pandas as pd
+
+from .loader import TomeLoader
+from .scribe import TomeScribe
+from .manifest import TomeManifest
+from .storage import create_tome_writer, create_tome_reader
+from .header_copier_fs import HeaderTomeCopierFs
+from .concurrency import map_ordered, add_log_option
+
+
+# pylint: disable=too-many-arguments
+# pylint: disable=too-many-locals
+def derive_tome_from_fs(
+    src_tome_name,
+    dest_tome_name,
+    fn,
+    /,
+    *,
+    ds_type="csds",
+    tome_collection_root_path="tomes",
+    columns=None,
+    workers=1,
+    behavior_if_complete="pass",
+    behavior_if_partial="continue",
+    log=None,
+):
+    """Make a tome by calling fn(df, keyset) on every page of another tome.
+
+    Every source page gives one page with the same keyset. When fn returns as
+    many rows as it was given, keys keep their row ranges, otherwise each key
+    spans the whole page. With workers > 1 pages are mapped by a pool of
+    processes (fn must be picklable) and still written in order.
+
+    A partial tome derived from the same source continues after its last
+    written page, unless the source was compacted since.
+    """
+    log = log if log is not None else structlog.get_logger()
+    src_manifest_key = "/".join(["tome", ds_type, src_tome_name, "tome"])
+    dest_manifest_key = "/".join(["tome", ds_type, dest_tome_name, "tome"])
+    src_loader = TomeLoader(
+        reader=create_tome_reader(
+            tome_collection_root_path, manifest_key=src_manifest_key, log=log
+        ),
+        log=log,
+    )
+    src_manifest = src_loader.manifest
+    if not src_manifest["isComplete"]:
+        raise Exception("Only complete tomes can be derived from")
+
+    existing_loader = TomeLoader(
+        reader=create_tome_reader(
+            tome_collection_root_path, manifest_key=dest_manifest_key, log=log
+        ),
+        log=log,
+    )
+    action = get_action(existing_loader, behavior_if_complete, behavior_if_partial)
+    if action == "pass":
+        return existing_loader
+    if action == "fail":
+        raise Exception(f"Tome already exists {dest_tome_name}")
+
+    manifest = TomeManifest(
+        tome_name=dest_tome_name,
+        ds_type=ds_type,
+        header_tome_name=src_manifest["headerTomeName"],
+        src_id=src_manifest["id"],
+        partition_by=src_manifest.get("partitionBy"),
+        parquet_options=src_manifest.get("parquet"),
+        log=log,
+    )
+    # Compaction keeps the source id but renumbers its pages
+    manifest.set(
+        {
+            **manifest.get(),
+            "derivedFrom": src_tome_name,
+            "sourceGeneration": src_manifest.get("generation", 0),
+        }
+    )
+    scribe = TomeScribe(
+        manifest=manifest,
+        writer=create_tome_writer(
+            tome_collection_root_path,
+            parquet_options=src_manifest.get("parquet"),
+            log=log,
+        ),
+        log=log,
+    )
+    if action == "continue":
+        if existing_loader.manifest["sourceId"] != src_manifest["id"]:
+            raise Exception(f"Tome {dest_tome_name} is derived from another tome")
+        if existing_loader.manifest.get("sourceGeneration") != src_manifest.get(
+            "generation", 0
+        ):
+            raise Exception(
+                f"Tome {dest_tome_name} is derived from pages of {src_tome_name} "
+                "that were compacted since"
+            )
+        scribe.set_manifest_data(existing_loader.manifest)
+        scribe.set_key_index(existing_loader.get_key_index())
+    elif src_manifest["headerTomeName"] is not None:
+        HeaderTomeCopierFs(
+            src_tome_name=src_manifest["headerTomeName"],
+            tome_collection_root_path=tome_collection_root_path,
+            dest_tome_name=dest_tome_name,
+            ds_type=ds_type,
+            log=log,
+        ).copy()
+
+    pages = src_manifest["pages"][scribe.page_counter :]
+    log.info(
+        "Derive Tome: Start",
+        src_tome_name=src_tome_name,
+        dest_tome_name=dest_tome_name,
+        page_count=len(pages),
+    )
+    options = {
+        "tome_collection_root_path": tome_collection_root_path,
+        "manifest_key": src_manifest_key,
+        "fn": fn,
+        "columns": columns,
+    }
+    add_log_option(options, log, workers)
+    map_page = partial(derive_page, **options)
+
+    scribe.start()
+    with closing(map_ordered(map_page, pages, workers)) as results:
+        for page, (df, keyset, key_rows) in zip(pages, results):
+            scribe.write_page(df, keyset, key_rows, partition=page.get("partition"))
+    scribe.finish()
+
+    return TomeLoader(
+        reader=create_tome_reader(
+            tome_collection_root_path, manifest_key=dest_manifest_key, log=log
+        ),
+        log=log,
+    )
+
+
+def get_action(existing_loader, behavior_if_complete, behavior_if_partial):
+    if not existing_loader.exists:
+        return "new"
+    if existing_loader.is_complete:
+        # A complete tome has nothing left to continue
+        return "pass" if behavior_if_complete == "continue" else behavior_if_complete
+    return behavior_if_partial
+
+
+def derive_page(
+    page, *, tome_collection_root_path, manifest_key, fn, columns, log=None
+):
+    """Call fn on a page and return its result with the keyset and key rows"""
+    reader = create_tome_reader(
+        tome_collection_root_path, manifest_key=manifest_key, has_header=False, log=log
+    )
+    df = reader.read_page_dataframe(page, columns=columns)
+    key_rows = reader.read_page_key_rows(page)
+    keyset = list(key_rows["key"])
+    result = fn(df, keyset)
+    result = pd.DataFrame() if result is None else result.reset_index(drop=True)
+    if len(result) == len(df) and not key_rows["row_start"].isna().any():
+        rows = list(
+            zip(key_rows["row_start"].astype(int), key_rows["row_stop"].astype(int))
+        )
+    else:
+        rows = [(0, len(result))] * len(keyset)
+    return result, keyset, rows
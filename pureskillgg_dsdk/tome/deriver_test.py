@@ -0,0 +1,107 @@
+# pylint: disable=missing-docstring,unused-argument
+import pytest
+import pandas as pd
+from .curator import TomeCuratorFs
+
+# pylint: disable=invalid-name
+default_header_name = "header_tome.1234-56-78,1234-56-78"
+src_tome_name = "round_end.1234-56-78,1234-56-78"
+tome_name = "round_end_features.1234-56-78,1234-56-78"
+
+
+def add_features(df, keyset):
+    return df.assign(double_value=df["value"] * 2)
+
+
+def count_rows(df, keyset):
+    return pd.DataFrame({"row_count": [len(df)], "key_count": [len(keyset)]})
+
+
+def fail_on_last_match(df, keyset):
+    if "994a9fed-d4a5-4096-8088-93b422be5025" in keyset[0]:
+        raise ValueError("Derive failed")
+    return add_features(df, keyset)
+
+
+def create_src_tome(tmp_path):
+    curator = TomeCuratorFs(
+        default_header_name=default_header_name,
+        ds_type="csds",
+        tome_collection_root_path=tmp_path,
+        ds_collection_root_path="fixtures",
+    )
+    curator.create_header_tome()
+    tomer = curator.make_tome(
+        src_tome_name,
+        ds_reading_instructions=[{"channel": "round_end"}],
+        max_page_row_count=1,
+    )
+    for data, _ in tomer.iterate():
+        tomer.concat(data["round_end"])
+    return curator
+
+
+def test_derive_tome(tmp_path):
+    curator = create_src_tome(str(tmp_path))
+    src_loader = curator.get_loader(src_tome_name)
+
+    loader = curator.derive_tome(src_tome_name, tome_name, add_features, workers=2)
+
+    src_df = src_loader.get_dataframe()
+    pd.testing.assert_frame_equal(
+        loader.get_dataframe(), src_df.assign(double_value=src_df["value"] * 2)
+    )
+    assert loader.get_keyset() == src_loader.get_keyset()
+    assert len(loader.manifest["pages"]) == len(src_loader.manifest["pages"])
+    assert loader.manifest["sourceId"] == src_loader.manifest["id"]
+    assert loader.manifest["derivedFrom"] == src_tome_name
+    assert loader.manifest["headerTomeName"] == default_header_name
+    assert loader.header.get_keyset() == src_loader.header.get_keyset()
+    key = src_loader.get_keyset()[1]
+    pd.testing.assert_frame_equal(
+        loader.get_rows_for_keys([key], columns=["value"]),
+        src_loader.get_rows_for_keys([key], columns=["value"]),
+    )
+
+
+def test_derive_tome_with_other_row_count(tmp_path):
+    curator = create_src_tome(str(tmp_path))
+
+    loader = curator.derive_tome(src_tome_name, tome_name, count_rows)
+
+    assert list(loader.get_dataframe()["key_count"]) == [1, 1, 1]
+    assert list(loader.get_key_index()["row_stop"]) == [1, 1, 1]
+
+
+def test_derive_tome_continue(tmp_path):
+    curator = create_src_tome(str(tmp_path))
+    with pytest.raises(ValueError, match="Derive failed"):
+        curator.derive_tome(src_tome_name, tome_name, fail_on_last_match)
+    manifest = curator.get_manifest(tome_name)
+    assert manifest["isComplete"] is False
+    assert len(manifest["pages"]) == 2
+
+    loader = curator.derive_tome(src_tome_name, tome_name, add_features)
+
+    assert loader.manifest["id"] == manifest["id"]
+    assert loader.manifest["pages"][:2] == manifest["pages"]
+    assert len(loader.get_dataframe()) == len(curator.get_dataframe(src_tome_name))
+    assert curator.derive_tome(src_tome_name, tome_name, count_rows).is_complete
+    assert "key_count" not in curator.get_dataframe(tome_name)
+
+
+def test_derive_tome_continue_after_compaction(tmp_path):
+    curator = create_src_tome(str(tmp_path))
+    with pytest.raises(ValueError, match="Derive failed"):
+        curator.derive_tome(src_tome_name, tome_name, fail_on_last_match)
+    assert curator.get_manifest(tome_name)["sourceGeneration"] == 0
+    curator.compact_tome(src_tome_name, max_page_row_count=100)
+
+    with pytest.raises(Exception, match="compacted since"):
+        curator.derive_tome(src_tome_name, tome_name, add_features)
+
+    loader = curator.derive_tome(
+        src_tome_name, tome_name, add_features, behavior_if_partial="overwrite"
+    )
+    assert loader.manifest["sourceGeneration"] == 1
+    assert loader.get_keyset() == curator.get_keyset(src_tome_name)
@@ -0,0 +1,154 @@
+import time
+from contextlib import closing
+from functools import partial
+import structlog
+
+from ..ds_io import DsReaderFs
+from ..ds_io.normalize_instructions import normalize_instructions
+from .constants import filter_ds_reader_logs
+from .concurrency import map_ordered, add_log_option
+from .maker import read_ds_channels
+
+
+class TomeFanOutMaker:
+    """Makes several tomes while reading every match only once.
+
+    makers are the TomeMakers of the tomes by name, each with its own scribe
+    and resume state, and map_fns the function called as map_fn(data, key)
+    for each of them. The channels in the union of their reading
+    instructions are read once per match, and every map_fn is given only the
+    channels and columns its tome asked for.
+    """
+
+    def __init__(
+        self,
+        *,
+        makers,
+        map_fns,
+        ds_collection_root_path,
+        workers=1,
+        print_status_frequency=100,
+        reader_class=DsReaderFs,
+        log=None,
+    ):
+        self._log = log if log is not None else structlog.get_logger()
+        self._log = structlog.wrap_logger(
+            self._log.bind(client="tome_fan_out_maker"),
+            processors=[filter_ds_reader_logs],
+        )
+        self._makers = makers
+        self._map_fns = map_fns
+        self._ds_collection_root_path = ds_collection_root_path
+        self._workers = workers
+        self._print_status_frequency = print_status_frequency
+        self._reader_class = reader_class
+
+    def run(self):
+        """Make all tomes, reading each match that any of them needs once"""
+        makers = {name: maker for name, maker in self._makers.items() if maker.start()}
+        items = get_key_items(makers)
+        self._log.info(
+            "Tome Fan Out: Start", tome_names=list(makers), key_count=len(items)
+        )
+
+        options = {
+            "map_fns": {name: self._map_fns[name] for name in makers},
+            "instructions": {
+                name: maker.ds_reading_instructions for name, maker in makers.items()
+            },
+            "root_path": self._ds_collection_root_path,
+            "reader_class": self._reader_class,
+        }
+        add_log_option(options, self._log, self._workers)
+        fn = partial(read_and_map_tomes, **options)
+
+        start_time = time.time()
+        with closing(map_ordered(fn, items, self._workers)) as results:
+            for key_counter, ((key, names), dfs) in enumerate(zip(items, results)):
+                for name in names:
+                    makers[name].concat(dfs[name], key)
+                    makers[name].end_key()
+                self._log_status(key_counter, len(items), start_time)
+
+        for maker in makers.values():
+            maker.finish()
+
+    def _log_status(self, key_counter, key_count, start_time):
+        if key_counter % self._print_status_frequency != 0 or key_counter == 0:
+            return
+        self._log.info(
+            "Tome Fan Out Update:",
+            percent_complete=round(100 * key_counter / key_count, 3),
+            keys_complete=key_counter,
+            minutes_elapsed=int((time.time() - start_time) / 60),
+        )
+
+
+def get_key_items(makers):
+    """Every key any maker needs, with the names of the makers that need it.
+
+    Keys are ordered so each maker still gets its keys in its keyset order,
+    e.g. a new tome is not given the keys a partial tome still needs first.
+    """
+    keysets = {name: list(maker.keyset) for name, maker in makers.items()}
+    positions = {
+        name: {key: i for i, key in enumerate(keyset)}
+        for name, keyset in keysets.items()
+    }
+    heads = dict.fromkeys(keysets, 0)
+    items = []
+    while True:
+        candidates = [
+            keysets[name][head]
+            for name, head in heads.items()
+            if head < len(keysets[name])
+        ]
+        if len(candidates) == 0:
+            return items
+        key = next(
+            (key for key in candidates if is_next_key(key, positions, heads)), None
+        )
+        if key is None:
+            raise Exception("Tomes need their keys in different orders")
+        names = [name for name in keysets if key in positions[name]]
+        for name in names:
+            heads[name] += 1
+        items.append((key, names))
+
+
+def is_next_key(key, positions, heads):
+    """True if no maker that needs key still needs another key before it"""
+    return all(positions[name].get(key, head) == head for name, head in heads.items())
+
+
+def get_union_instructions(instructions):
+    """Instructions to read everything that any of the tomes needs"""
+    if any(instruction is None for instruction in instructions):
+        return None
+    return [instruction for tome in instructions for instruction in tome]
+
+
+def select_channels(data, instructions):
+    if instructions is None:
+        return data
+    selected = {}
+    for instruction in normalize_instructions(instructions):
+        df = data[instruction["channel"]]
+        columns = instruction.get("columns")
+        selected[instruction["channel"]] = df if columns is None else df[columns]
+    return selected
+
+
+def read_and_map_tomes(item, *, map_fns, instructions, **kwargs):
+    key, names = item
+    data = read_ds_channels(
+        key,
+        ds_reading_instructions=get_union_instructions(
+            [instructions[name] for name in names]
+        ),
+        **kwargs,
+    )
+    return {
+        name: map_fns[name](select_channels(data, instructions[name]), key)
+        for name in names
+    }
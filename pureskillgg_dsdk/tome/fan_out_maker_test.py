@@ -0,0 +1,144 @@
+# pylint: disable=missing-docstring,unused-argument
+from types import SimpleNamespace
+import pytest
+import pandas as pd
+from .curator import TomeCuratorFs
+from .fan_out_maker import get_key_items
+
+# pylint: disable=invalid-name
+default_header_name = "header_tome.1234-56-78,1234-56-78"
+round_end_name = "round_end.1234-56-78,1234-56-78"
+player_death_name = "player_death.1234-56-78,1234-56-78"
+
+round_end_instructions = [{"channel": "round_end"}]
+player_death_instructions = [{"channel": "player_death", "columns": ["tick"]}]
+
+
+def map_round_end(data, key):
+    return data["round_end"]
+
+
+def map_player_death(data, key):
+    assert list(data) == ["player_death"]
+    return data["player_death"]
+
+
+def create_curator(tmp_path):
+    curator = TomeCuratorFs(
+        default_header_name=default_header_name,
+        ds_type="csds",
+        tome_collection_root_path=str(tmp_path),
+        ds_collection_root_path="fixtures",
+    )
+    curator.create_header_tome()
+    return curator
+
+
+def get_tomes(**options):
+    return {
+        round_end_name: {
+            "ds_reading_instructions": round_end_instructions,
+            "map_fn": map_round_end,
+            "max_page_row_count": 1,
+            **options,
+        },
+        player_death_name: {
+            "ds_reading_instructions": player_death_instructions,
+            "map_fn": map_player_death,
+            **options,
+        },
+    }
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_make_tomes(tmp_path, workers):
+    curator = create_curator(tmp_path / "fan_out")
+    expected = create_curator(tmp_path / "single")
+    for name, options in get_tomes().items():
+        expected.make_tome(name, **options).run()
+
+    curator.make_tomes(get_tomes(), workers=workers).run()
+
+    for name in [round_end_name, player_death_name]:
+        manifest = curator.get_manifest(name)
+        assert manifest["isComplete"] is True
+        assert len(manifest["pages"]) == len(expected.get_manifest(name)["pages"])
+        pd.testing.assert_frame_equal(
+            curator.get_dataframe(name), expected.get_dataframe(name)
+        )
+        assert curator.get_keyset(name) == expected.get_keyset(name)
+    assert list(curator.get_dataframe(player_death_name)) == ["tick"]
+
+
+def test_make_tomes_resume(tmp_path):
+    curator = create_curator(tmp_path)
+    curator.make_tome(round_end_name, **get_tomes()[round_end_name]).run()
+    tomer = curator.make_tome(
+        player_death_name, ds_reading_instructions=player_death_instructions
+    )
+    for data, _ in tomer.iterate():
+        tomer.concat(data["player_death"])
+        break
+    complete_id = curator.get_manifest(round_end_name)["id"]
+    partial_manifest = curator.get_manifest(player_death_name)
+    assert partial_manifest["isComplete"] is False
+
+    fan_out = curator.make_tomes(get_tomes())
+    fan_out.run()
+
+    assert curator.get_manifest(round_end_name)["id"] == complete_id
+    manifest = curator.get_manifest(player_death_name)
+    assert manifest["isComplete"] is True
+    assert manifest["id"] == partial_manifest["id"]
+    assert len(curator.get_keyset(player_death_name)) == 3
+
+
+def test_make_tomes_resume_keeps_key_order(tmp_path):
+    curator = create_curator(tmp_path)
+    tomer = curator.make_tome(
+        player_death_name,
+        ds_reading_instructions=player_death_instructions,
+        max_page_row_count=1,
+    )
+    for data, _ in tomer.iterate():
+        tomer.concat(data["player_death"])
+        break
+    header_keyset = curator.get_keyset(default_header_name)
+    assert curator.get_keyset(player_death_name) == header_keyset[:1]
+    tomes = get_tomes()
+
+    curator.make_tomes(
+        {name: tomes[name] for name in [player_death_name, round_end_name]}
+    ).run()
+
+    assert curator.get_keyset(player_death_name) == header_keyset
+    assert curator.get_keyset(round_end_name) == header_keyset
+
+
+def test_get_key_items():
+    makers = {
+        "a": SimpleNamespace(keyset=["k3", "k4"]),
+        "b": SimpleNamespace(keyset=["k1", "k2", "k3", "k4"]),
+        "c": SimpleNamespace(keyset=["k2", "k4"]),
+    }
+    assert get_key_items(makers) == [
+        ("k1", ["b"]),
+        ("k2", ["b", "c"]),
+        ("k3", ["a", "b"]),
+        ("k4", ["a", "b", "c"]),
+    ]
+
+
+def test_get_key_items_conflicting_order():
+    makers = {
+        "a": SimpleNamespace(keyset=["k1", "k2"]),
+        "b": SimpleNamespace(keyset=["k2", "k1"]),
+    }
+    with pytest.raises(Exception, match="different orders"):
+        get_key_items(makers)
+
+
+def test_make_tomes_requires_map_fn(tmp_path):
+    curator = create_curator(tmp_path)
+    with pytest.raises(Exception, match="has no map_fn"):
+        curator.make_tomes({round_end_name: {}})
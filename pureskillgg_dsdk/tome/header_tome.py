@@ -1,14 +1,26 @@
 import os
+from contextlib import closing
+from functools import partial
 from glob import glob
 import structlog
+import pandas as pd
 
 from ..ds_io import DsReaderFs, GameDsLoader
 from .loader import TomeLoader
-from .scribe import TomeScribe
+from .scribe import TomeScribe, get_row_per_key
 from .manifest import TomeManifest
-from .writer_fs import TomeWriterFs
-from .reader_fs import TomeReaderFs
-from .constants import filter_ds_reader_logs, warn_if_invalid_tome_name
+from .storage import create_tome_writer, create_tome_reader
+from .constants import (
+    MATCH_DATE_COLUMN,
+    filter_ds_reader_logs,
+    get_date_filters,
+    get_key_date,
+    warn_if_invalid_tome_name,
+)
+from .concurrency import map_ordered, add_log_option
+from .collection_index import DsCollectionIndex
+
+DEFAULT_MAX_PAGE_ROW_COUNT = 100_000
 
 
 def default_tome_name():
@@ -26,9 +38,31 @@ def create_header_tome_from_fs(
     ds_collection_root_path="data",
     path_depth=None,
     update_frequency=0,
+    workers=1,
+    batch_size=100,
+    incremental=False,
+    use_collection_index=False,
+    max_page_size_mb=None,
+    max_page_row_count=DEFAULT_MAX_PAGE_ROW_COUNT,
+    partition_by_date=False,
     log=None,
 ):
-    """Make the header tome"""
+    """Make the header tome.
+
+    With workers > 1, header channels are read by a pool of processes in
+    batches of batch_size matches. Matches are added in sorted key order
+    either way, so the header is the same for any number of workers.
+
+    With incremental=True and a complete header tome of the same name, only
+    matches missing from it are read and they are appended as new pages.
+
+    With use_collection_index=True, matches are listed from a DsCollectionIndex
+    beside the collection instead of walking the whole tree.
+
+    Pages are written once they reach max_page_size_mb or max_page_row_count.
+    With partition_by_date=True, a match_date column is added from the
+    yyyy/mm/dd part of each key and every page only holds one date.
+    """
     name = default_tome_name() if tome_name is None else tome_name
     warn_if_invalid_tome_name(name)
     log = (
@@ -39,36 +73,108 @@ def create_header_tome_from_fs(
         )
     )
 
-    writer = TomeWriterFs(root_path=tome_collection_root_path, log=log)
-    tome_manifest = TomeManifest(tome_name=name, ds_type=ds_type, is_header=True)
-    scribe = TomeScribe(manifest=tome_manifest, writer=writer, log=log)
+    manifest_key = "/".join(["tome", ds_type, name, "tome"])
+    writer = create_tome_writer(tome_collection_root_path, log=log)
+    tome_manifest = TomeManifest(
+        tome_name=name,
+        ds_type=ds_type,
+        is_header=True,
+        partition_by=MATCH_DATE_COLUMN if partition_by_date else None,
+    )
+    scribe = TomeScribe(
+        manifest=tome_manifest,
+        writer=writer,
+        max_page_size_mb=max_page_size_mb,
+        max_page_row_count=max_page_row_count,
+        log=log,
+    )
+
+    if use_collection_index:
+        key_paths = DsCollectionIndex(
+            root_path=ds_collection_root_path, ds_type=ds_type, log=log
+        ).get_manifest_keys()
+    else:
+        key_paths = get_manifest_key_paths_from_glob(ds_collection_root_path, ds_type)
+    existing_loader = TomeLoader(
+        reader=create_tome_reader(
+            tome_collection_root_path, manifest_key=manifest_key, log=log
+        ),
+        log=log,
+    )
+    if incremental and existing_loader.is_complete:
+        key_index = existing_loader.get_key_index()
+        existing_keys = set(key_index["key"])
+        key_paths = [key for key in key_paths if key not in existing_keys]
+        log.info("Create Header: Incremental", new_key_count=len(key_paths))
+        if len(key_paths) == 0:
+            return existing_loader
+        scribe.set_manifest_data(get_resumed_manifest_data(existing_loader.manifest))
+        scribe.set_key_index(key_index)
 
+    # Refreshed headers keep the partitioning they were created with
+    is_partitioned = "partitionBy" in tome_manifest.get()
     scribe.start()
-    key_paths = get_manifest_key_paths_from_glob(ds_collection_root_path, ds_type)
-    for counter, manifest_key_path in enumerate(key_paths):
-        ds_loader = fetch_ds_loader_from_fs(
-            ds_collection_root_path, manifest_key_path, log
-        )
-        df = ds_loader.get_channel({"channel": "header"})
-        df["key"] = ds_loader.manifest["key"]
-        df["match_id"] = ds_loader.manifest["id"]
-        scribe.concat(df, ds_loader.manifest["key"])
-        if update_frequency != 0 and counter % update_frequency == 0 and counter > 0:
-            log.info(
-                "Create Header Update", percent_done=100 * counter / len(key_paths)
-            )
+    batches = [
+        key_paths[start : start + batch_size]
+        for start in range(0, len(key_paths), batch_size)
+    ]
+    options = add_log_option({"root_path": ds_collection_root_path}, log, workers)
+    fn = partial(read_header_rows, **options)
+
+    counter = 0
+    with closing(map_ordered(fn, batches, workers)) as results:
+        for rows in results:
+            for key, df in rows:
+                if is_partitioned:
+                    match_date = get_key_date(key)
+                    df[MATCH_DATE_COLUMN] = match_date
+                    scribe.concat(df, key, partition=match_date)
+                else:
+                    scribe.concat(df, key)
+                is_update = update_frequency != 0 and counter % update_frequency == 0
+                if is_update and counter > 0:
+                    log.info(
+                        "Create Header Update",
+                        percent_done=100 * counter / len(key_paths),
+                    )
+                counter += 1
 
     scribe.finish()
 
-    reader = TomeReaderFs(
-        root_path=tome_collection_root_path,
-        manifest_key="/".join(["tome", ds_type, tome_name, "tome"]),
-        log=log,
+    reader = create_tome_reader(
+        tome_collection_root_path, manifest_key=manifest_key, log=log
     )
 
     return TomeLoader(reader=reader, log=log)
 
 
+def get_resumed_manifest_data(data):
+    # The tome is incomplete until the new pages and key index are written
+    data = {key: value for key, value in data.items() if key != "keyIndex"}
+    data["pages"] = list(data["pages"])
+    data["isComplete"] = False
+    return data
+
+
+def read_header_rows(manifest_keys, *, root_path, log=None):
+    """Header channel of each match with its key and id"""
+    log = (
+        log
+        if log is not None
+        else structlog.wrap_logger(
+            structlog.get_logger(), processors=[filter_ds_reader_logs]
+        )
+    )
+    rows = []
+    for manifest_key in manifest_keys:
+        ds_loader = fetch_ds_loader_from_fs(root_path, manifest_key, log)
+        df = ds_loader.get_channel({"channel": "header"})
+        df["key"] = ds_loader.manifest["key"]
+        df["match_id"] = ds_loader.manifest["id"]
+        rows.append((ds_loader.manifest["key"], df))
+    return rows
+
+
 # pylint: disable=too-many-locals
 def create_subheader_tome_from_fs(
     name,
@@ -80,28 +186,34 @@ def create_subheader_tome_from_fs(
     ds_type="csds",
     is_copied_header=False,
     preserve_src_id=False,
+    max_page_size_mb=None,
+    max_page_row_count=DEFAULT_MAX_PAGE_ROW_COUNT,
+    start_date=None,
+    end_date=None,
     log=None,
 ):
     """
     selector is passed to filter out rows from the header
-    by doing df = df.loc[selector]
+    by doing df = df.loc[selector] on each page of the source header,
+    so only one source page is held in memory at a time
+
+    start_date and end_date (yyyy-mm-dd, inclusive) only keep matches in
+    that range. Pages of a date partitioned header outside it are not read.
     """
     warn_if_invalid_tome_name(name)
     log = log if log is not None else structlog.get_logger()
     src_name = default_tome_name() if src_tome_name is None else src_tome_name
 
-    src_reader = TomeReaderFs(
-        root_path=tome_collection_root_path,
+    src_reader = create_tome_reader(
+        tome_collection_root_path,
         manifest_key="/".join(["tome", ds_type, src_name, "tome"]),
         log=log,
     )
     src_loader = TomeLoader(reader=src_reader, log=log)
 
-    writer = TomeWriterFs(
-        root_path=tome_collection_root_path,
-        log=log,
-    )
+    writer = create_tome_writer(tome_collection_root_path, log=log)
 
+    partition_by = src_loader.manifest.get("partitionBy")
     manifest = TomeManifest(
         tome_name=name,
         ds_type=src_loader.manifest["dsType"],
@@ -109,15 +221,36 @@ def create_subheader_tome_from_fs(
         is_header=True,
         src_id=src_loader.manifest["id"] if preserve_src_id else None,
         is_copied_header=is_copied_header,
+        partition_by=partition_by,
     )
-    scribe = TomeScribe(writer=writer, manifest=manifest, log=log)
+    scribe = TomeScribe(
+        writer=writer,
+        manifest=manifest,
+        max_page_size_mb=max_page_size_mb,
+        max_page_row_count=max_page_row_count,
+        log=log,
+    )
+    date_filters = get_date_filters(start_date, end_date)
     scribe.start()
-    df = src_loader.get_dataframe().loc[selector]
-    scribe.concat(df, list(df["key"]))
+    for src_df, _ in src_loader.iterate_pages(
+        filters=date_filters if partition_by is not None else None, prefetch=1
+    ):
+        if date_filters is not None and partition_by is None:
+            src_df = src_df.loc[is_in_date_range(src_df["key"], start_date, end_date)]
+        df = src_df.loc[selector]
+        if partition_by is None:
+            concat_header_rows(scribe, df)
+            continue
+        for partition, partition_df in df.groupby(
+            partition_by, sort=False, dropna=False
+        ):
+            concat_header_rows(
+                scribe, partition_df, None if pd.isna(partition) else partition
+            )
     scribe.finish()
 
-    reader = TomeReaderFs(
-        root_path=tome_collection_root_path,
+    reader = create_tome_reader(
+        tome_collection_root_path,
         manifest_key=manifest.get()["key"],
         log=log,
     )
@@ -125,6 +258,32 @@ def create_subheader_tome_from_fs(
     return TomeLoader(reader=reader, log=log)
 
 
+def concat_header_rows(scribe, df, partition=None):
+    """Concat header rows (one per key) in runs that fit the current page"""
+    start = 0
+    while start < len(df):
+        stop = start + max(scribe.get_page_row_capacity(df.iloc[start:]), 1)
+        run = df.iloc[start:stop]
+        scribe.concat(
+            run,
+            list(run["key"]),
+            partition=partition,
+            key_rows=get_row_per_key(len(run)),
+        )
+        start = stop
+
+
+def is_in_date_range(keys, start_date, end_date):
+    dates = keys.map(get_key_date)
+    mask = dates.notna()
+    dates = dates.fillna("")
+    if start_date is not None:
+        mask &= dates >= str(start_date)
+    if end_date is not None:
+        mask &= dates <= str(end_date)
+    return mask
+
+
 def get_manifest_key_paths_from_glob(ds_root_path, ds_type):
     root_path = os.path.normpath(ds_root_path) + os.sep
     paths = glob(os.path.join(root_path, "*", "**", ds_type), recursive=True)
@@ -132,8 +291,7 @@ def get_manifest_key_paths_from_glob(ds_root_path, ds_type):
     manifest_keys = [
         path[len(os.path.commonprefix([root_path, path])) :] for path in paths
     ]
-    manifest_keys = set(manifest_keys)
-    return manifest_keys
+    return sorted(set(manifest_keys))
 
 
 def fetch_ds_loader_from_fs(root_path, manifest_key, log):
@@ -0,0 +1,110 @@
+import os
+import shutil
+import structlog
+import rapidjson
+import pandas as pd
+
+
+class TomeJournalFs:
+    """Append-only journal of the keys added to a tome that is being made.
+
+    Every concat on the scribe writes its dataframe to a parquet chunk and
+    then appends a line with the keys and the page they were added to, so
+    keys of a page that was never written can be restored after a crash
+    instead of being read again. A key may be added with several concats,
+    so only keys followed by an end line are restored.
+    """
+
+    def __init__(self, *, path, log=None):
+        self._log = log if log is not None else structlog.get_logger()
+        self._log = self._log.bind(client="tome_journal_fs", path=path)
+        self._path = path
+        self._file = None
+        self._chunk_counter = 0
+        self._page_chunks = {}
+
+    def append(self, keys, df, page_number, partition=None, key_rows=None):
+        file = self._open()
+        entry = {
+            "keys": keys,
+            "page": page_number,
+            "partition": partition,
+            "chunk": None,
+            "key_rows": key_rows,
+        }
+        if df is not None and len(df) > 0:
+            entry["chunk"] = f"chunk_{str(self._chunk_counter).zfill(8)}.parquet"
+            self._chunk_counter += 1
+            df.to_parquet(self._get_path(entry["chunk"]), index=False)
+            self._page_chunks.setdefault(page_number, []).append(entry["chunk"])
+        file.write(rapidjson.dumps(entry) + "\n")
+        file.flush()
+
+    def end_key(self):
+        """Mark the keys appended since the last end as complete"""
+        file = self._open()
+        file.write(rapidjson.dumps({"end": True}) + "\n")
+        file.flush()
+
+    def read(self):
+        """Entries of the complete keys in the order they were appended"""
+        path = self._get_path("journal.jsonl")
+        if not os.path.exists(path):
+            return []
+        entries = []
+        complete_entries = []
+        with open(path, "r", encoding="utf-8") as fin:
+            for line in fin:
+                try:
+                    entry = rapidjson.loads(line)
+                except ValueError:
+                    # The last line may be cut off by a crash
+                    self._log.warning("Read Journal: Skipped invalid line")
+                    break
+                if entry.get("end"):
+                    complete_entries += entries
+                    entries = []
+                else:
+                    entries.append(entry)
+        if len(entries) > 0:
+            self._log.info("Read Journal: Skipped incomplete key")
+        return complete_entries
+
+    def read_chunk(self, entry):
+        if entry["chunk"] is None:
+            return None
+        return pd.read_parquet(self._get_path(entry["chunk"]))
+
+    def end_page(self, page_number):
+        """Remove the spilled chunks of a page once it is written"""
+        for chunk in self._page_chunks.pop(page_number, []):
+            os.remove(self._get_path(chunk))
+
+    def reset(self):
+        """Start an empty journal"""
+        self.remove()
+        os.makedirs(self._path, exist_ok=True)
+
+    def remove(self):
+        self.close()
+        self._chunk_counter = 0
+        self._page_chunks = {}
+        if os.path.exists(self._path):
+            self._log.info("Remove Journal: Start")
+            shutil.rmtree(self._path)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        if self._file is None:
+            os.makedirs(self._path, exist_ok=True)
+            self._file = open(  # pylint: disable=consider-using-with
+                self._get_path("journal.jsonl"), "a", encoding="utf-8"
+            )
+        return self._file
+
+    def _get_path(self, name):
+        return os.path.join(self._path, name)
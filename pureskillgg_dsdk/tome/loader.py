@@ -1,5 +1,22 @@
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
 import structlog
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+
+from .statistics import page_may_match
+from .concurrency import imap_ordered
+from .batches import shuffle_batches, to_batch_format
+from .parquet_options import DEFAULT_PARQUET_OPTIONS
+from .aggregation import (
+    parse_aggregations,
+    get_columns,
+    get_partial,
+    merge_partials,
+    get_result,
+)
 
 
 class TomeLoader:
@@ -9,6 +26,8 @@ class TomeLoader:
         self._manifest = None
         self._metadata = None
         self._exists = None
+        self._key_index = None
+        self._page_row_offsets = None
         self.has_header = has_header
         self.header = None
 
@@ -41,6 +60,11 @@ class TomeLoader:
         self._load()
         return self._manifest
 
+    @property
+    def parquet_options(self):
+        """Parquet settings the pages were written with"""
+        return {**DEFAULT_PARQUET_OPTIONS, **self.manifest.get("parquet", {})}
+
     def _load(self) -> None:
         is_loaded = self._manifest is not None and self._metadata is not None
         if is_loaded:
@@ -48,14 +72,31 @@ class TomeLoader:
         self._metadata = self._reader.read_metadata()
         self._manifest = self._reader.read_manifest()
 
-    def get_dataframe(self):
-        self._load()
+    def get_dataframe(self, columns=None, filters=None, max_workers=1, as_arrow=False):
+        """Read all pages, optionally only some columns and matching rows.
 
-        dfs = [
-            self._reader.read_page_dataframe(page) for page in self.manifest["pages"]
-        ]
-        df = pd.concat(dfs)
-        return df
+        columns and filters are passed to the parquet reader, so unused
+        columns and row groups are not decoded. filters use the pyarrow
+        format, e.g. [("map_name", "==", "de_dust2")]. Pages whose
+        statistics show that no row can match are skipped.
+
+        Pages are read by max_workers threads into one Arrow table, which is
+        returned as is when as_arrow is True or converted to pandas once.
+        Pages whose column types cannot be unified (e.g. int64 and string)
+        are converted one by one and combined by pandas instead, and raise
+        with as_arrow. The index of the dataframe runs over all pages.
+        """
+        tables = self._read_tables(columns, filters, max_workers)
+        try:
+            table = pa.concat_tables(tables, promote_options="permissive")
+        except (pa.ArrowTypeError, pa.ArrowInvalid):
+            if as_arrow:
+                raise
+            self._log.warning("Page schemas differ, combining pages with pandas")
+            return pd.concat([table.to_pandas() for table in tables], ignore_index=True)
+        if as_arrow:
+            return table
+        return table.to_pandas(split_blocks=True, self_destruct=True)
 
     def get_keyset(self):
         self._load()
@@ -65,10 +106,223 @@ class TomeLoader:
             keyset += self._reader.read_page_keyset(page)
         return keyset
 
-    def iterate_pages(self):
+    def get_key_index(self):
+        """Dataframe with the page and row range (row_start, row_stop) of each key"""
         self._load()
-        for page in self.manifest["pages"]:
-            yield (
-                self._reader.read_page_dataframe(page),
+        if self._key_index is not None:
+            return self._key_index
+        if "keyIndex" in self.manifest:
+            self._key_index = self._reader.read_key_index(self.manifest["keyIndex"])
+            return self._key_index
+        # Partial tomes only have the row ranges in the page keysets
+        dfs = [
+            self._reader.read_page_key_rows(page).assign(page=page["number"])
+            for page in self.manifest["pages"]
+        ]
+        self._key_index = pd.concat(
+            [pd.DataFrame(columns=["key", "row_start", "row_stop", "page"]), *dfs],
+            ignore_index=True,
+        )[["key", "page", "row_start", "row_stop"]]
+        return self._key_index
+
+    @property
+    def row_count(self):
+        """Number of rows in the tome"""
+        return self._get_page_row_offsets()[-1]
+
+    def get_row(self, index, columns=None):
+        """Row at index as a series, reading only the page that holds it.
+
+        Pages are located with the row counts in the page statistics.
+        """
+        offsets = self._get_page_row_offsets()
+        if not 0 <= index < offsets[-1]:
+            raise IndexError(f"Row {index} out of range for {offsets[-1]} rows")
+        position = bisect_right(offsets, index) - 1
+        page = self.manifest["pages"][position]
+        df = self._reader.read_page_dataframe(page, columns=columns)
+        return df.iloc[index - offsets[position]]
+
+    def get_rows_for_keys(self, keys, columns=None):
+        """Rows for the given keys, in the order of keys.
+
+        Uses the key index to only read the pages that contain the keys.
+        """
+        index = self.get_key_index()
+        index = index[index["key"].isin(keys)]
+        if index["row_start"].isna().any():
+            raise Exception("Tome pages have no row ranges, remake the tome")
+
+        order = {key: position for position, key in enumerate(keys)}
+        index = index.assign(order=index["key"].map(order))
+        index = index.sort_values(["order", "page", "row_start"], kind="stable")
+        index = index.drop_duplicates(["page", "row_start", "row_stop"])
+
+        pages = {page["number"]: page for page in self.manifest["pages"]}
+        dfs = {
+            number: self._reader.read_page_dataframe(pages[number], columns=columns)
+            for number in index["page"].unique()
+        }
+        rows = [
+            dfs[number].iloc[int(row_start) : int(row_stop)]
+            for number, row_start, row_stop in index[
+                ["page", "row_start", "row_stop"]
+            ].itertuples(index=False, name=None)
+        ]
+        if len(rows) == 0:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(rows, ignore_index=True)
+
+    def iterate_pages(self, columns=None, filters=None, prefetch=0):
+        """Yield the dataframe and keyset of each page (see get_dataframe).
+
+        With prefetch > 0, up to that many upcoming pages are read on a
+        background thread while the current page is being used.
+        """
+        self._load()
+        pages = self._select_pages(filters)
+
+        def read(page):
+            return (
+                self._reader.read_page_dataframe(
+                    page, columns=columns, filters=filters
+                ),
                 self._reader.read_page_keyset(page),
             )
+
+        if prefetch <= 0:
+            for page in pages:
+                yield read(page)
+            return
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with closing(imap_ordered(executor, read, pages, prefetch + 1)) as results:
+                yield from results
+
+    # pylint: disable=too-many-arguments
+    def aggregate(
+        self, by, aggregations, filters=None, max_workers=1, sketch_size=1024, seed=0
+    ):
+        """Group-by aggregation over all pages in bounded memory.
+
+        aggregations maps output names to (column, function) with function
+        one of sum, count, mean, min or max, or to (column, "quantile", q).
+        Each page is reduced to per group partials by max_workers threads and
+        merged into a running result, so only one partial per group is kept.
+        Quantiles are estimated from a sample of up to sketch_size rows per
+        group, which is exact for smaller groups.
+        """
+        self._load()
+        by = [by] if isinstance(by, str) else list(by)
+        specs = parse_aggregations(aggregations)
+        columns = get_columns(by, specs)
+
+        def read(page):
+            df = self._reader.read_page_dataframe(
+                page, columns=columns, filters=filters
+            )
+            rng = np.random.default_rng([seed, page["number"]])
+            return get_partial(df, by, specs, sketch_size=sketch_size, rng=rng)
+
+        # Read one page when nothing matches to get an empty result
+        pages = self._select_pages(filters) or self.manifest["pages"][:1]
+        partial = None
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for page_partial in imap_ordered(executor, read, pages, 2 * max_workers):
+                partial = (
+                    page_partial
+                    if partial is None
+                    else merge_partials(
+                        partial, page_partial, by, specs, sketch_size=sketch_size
+                    )
+                )
+        return get_result(partial, by, specs)
+
+    # pylint: disable=too-many-arguments
+    def iter_batches(
+        self,
+        batch_size,
+        shuffle_buffer_rows=0,
+        columns=None,
+        seed=None,
+        *,
+        batch_format="numpy",
+        drop_last=False,
+        prefetch=1,
+        interleave_pages=4,
+    ):
+        """Yield batches of batch_size rows from all pages.
+
+        With shuffle_buffer_rows > 0, pages are read in random order and each
+        batch is sampled from the rows left in at least interleave_pages open
+        pages (more if they hold fewer than shuffle_buffer_rows rows), so
+        only those and the prefetched pages are held in memory. Use a
+        different seed for each epoch to get a different order.
+
+        Batches are dicts of column name to NumPy array, or Arrow record
+        batches when batch_format is "arrow". The last batch may be smaller
+        unless drop_last is True.
+        """
+        if batch_size <= 0:
+            raise Exception(f"Batch size must be positive, got {batch_size}")
+        if batch_format not in ("numpy", "arrow"):
+            raise Exception(f"Unsupported batch format {batch_format}")
+        self._load()
+        rng = np.random.default_rng(seed)
+        pages = self.manifest["pages"]
+        if shuffle_buffer_rows > 0:
+            pages = [pages[index] for index in rng.permutation(len(pages))]
+
+        def read(page):
+            return self._reader.read_page_table(page, columns=columns)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            with closing(
+                imap_ordered(executor, read, pages, max(prefetch, 0) + 1)
+            ) as tables:
+                for batch in shuffle_batches(
+                    tables,
+                    batch_size=batch_size,
+                    shuffle_buffer_rows=shuffle_buffer_rows,
+                    interleave_pages=interleave_pages,
+                    rng=rng,
+                    drop_last=drop_last,
+                ):
+                    yield to_batch_format(batch, batch_format)
+
+    def _read_tables(self, columns, filters, max_workers):
+        self._load()
+
+        # Read one page when nothing matches to get an empty table
+        pages = self._select_pages(filters) or self.manifest["pages"][:1]
+
+        def read(page):
+            return self._reader.read_page_table(page, columns=columns, filters=filters)
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(read, pages))
+
+    def _get_page_row_offsets(self):
+        self._load()
+        if self._page_row_offsets is not None:
+            return self._page_row_offsets
+        offsets = [0]
+        for page in self.manifest["pages"]:
+            offsets.append(offsets[-1] + self._get_page_row_count(page))
+        self._page_row_offsets = offsets
+        return offsets
+
+    def _get_page_row_count(self, page):
+        if "statistics" in page:
+            return page["statistics"]["rowCount"]
+        # Pages written without statistics are counted without reading columns
+        return self._reader.read_page_table(page, columns=[]).num_rows
+
+    def _select_pages(self, filters):
+        pages = self.manifest["pages"]
+        selected = [page for page in pages if page_may_match(page, filters)]
+        if len(selected) < len(pages):
+            self._log.info(
+                "Skipped pages by statistics", skipped=len(pages) - len(selected)
+            )
+        return selected
@@ -0,0 +1,210 @@
+# pylint: disable=missing-docstring,unused-argument
+import threading
+import pytest
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from .loader import TomeLoader
+
+
+class FakeReader:
+    def __init__(self, page_count):
+        self.manifest = {"pages": [{"number": n} for n in range(page_count)]}
+        self.reads = []
+        self.exists = True
+
+    def read_manifest(self):
+        return self.manifest
+
+    def read_metadata(self):
+        return {}
+
+    def read_page_dataframe(self, page, columns=None, filters=None):
+        self.reads.append((page["number"], threading.current_thread().name))
+        if page["number"] == 3:
+            raise OSError("bad page")
+        return pd.DataFrame({"x": [page["number"]]})
+
+    def read_page_table(self, page, columns=None, filters=None):
+        start = page["number"] * 10
+        return pa.table({"x": list(range(start, start + 10))})
+
+    def read_page_keyset(self, page):
+        return [f"key_{page['number']}"]
+
+
+def test_iterate_pages_prefetch():
+    reader = FakeReader(3)
+    loader = TomeLoader(reader=reader, has_header=False)
+
+    pages = loader.iterate_pages(prefetch=2)
+    df, keyset = next(pages)
+    assert keyset == ["key_0"]
+    assert list(df["x"]) == [0]
+
+    assert [keyset for _, keyset in pages] == [["key_1"], ["key_2"]]
+    assert all(name != threading.current_thread().name for _, name in reader.reads)
+
+
+def test_iterate_pages_prefetch_raises_errors():
+    loader = TomeLoader(reader=FakeReader(5), has_header=False)
+    with pytest.raises(OSError):
+        for _ in loader.iterate_pages(prefetch=1):
+            pass
+
+
+def test_iterate_pages_prefetch_stops_early():
+    reader = FakeReader(3)
+    loader = TomeLoader(reader=reader, has_header=False)
+    for _ in loader.iterate_pages(prefetch=1):
+        break
+    assert len(reader.reads) <= 2
+
+
+def test_iter_batches_in_order():
+    loader = TomeLoader(reader=FakeReader(3), has_header=False)
+    batches = list(loader.iter_batches(8))
+    assert [len(batch["x"]) for batch in batches] == [8, 8, 8, 6]
+    assert list(np.concatenate([batch["x"] for batch in batches])) == list(range(30))
+
+
+def test_iter_batches_shuffle():
+    loader = TomeLoader(reader=FakeReader(3), has_header=False)
+    batches = list(loader.iter_batches(8, shuffle_buffer_rows=12, seed=1))
+    rows = np.concatenate([batch["x"] for batch in batches])
+    assert sorted(rows) == list(range(30))
+    assert list(rows) != list(range(30))
+
+    again = list(loader.iter_batches(8, shuffle_buffer_rows=12, seed=1))
+    assert list(np.concatenate([batch["x"] for batch in again])) == list(rows)
+
+
+def test_iter_batches_arrow_drop_last():
+    loader = TomeLoader(reader=FakeReader(3), has_header=False)
+    batches = list(
+        loader.iter_batches(
+            8, shuffle_buffer_rows=12, seed=1, batch_format="arrow", drop_last=True
+        )
+    )
+    assert all(isinstance(batch, pa.RecordBatch) for batch in batches)
+    assert [batch.num_rows for batch in batches] == [8, 8, 8]
+
+
+class LargePagesReader(FakeReader):
+    def read_page_table(self, page, columns=None, filters=None):
+        start = page["number"] * 1000
+        return pa.table({"x": list(range(start, start + 1000))})
+
+
+def test_iter_batches_shuffle_mixes_pages():
+    loader = TomeLoader(reader=LargePagesReader(5), has_header=False)
+    batches = list(loader.iter_batches(100, shuffle_buffer_rows=200, seed=1))
+
+    rows = np.concatenate([batch["x"] for batch in batches])
+    assert sorted(rows) == list(range(5000))
+    for batch in batches[:9]:
+        assert len(np.unique(batch["x"] // 1000)) >= 3
+
+
+def test_get_row_reads_one_page():
+    reader = FakeReader(3)
+    for page in reader.manifest["pages"]:
+        page["statistics"] = {"rowCount": 1}
+    loader = TomeLoader(reader=reader, has_header=False)
+
+    assert loader.row_count == 3
+    assert loader.get_row(2)["x"] == 2
+    assert [number for number, _ in reader.reads] == [2]
+    with pytest.raises(IndexError):
+        loader.get_row(3)
+
+
+def test_row_count_without_statistics():
+    loader = TomeLoader(reader=FakeReader(3), has_header=False)
+    assert loader.row_count == 30
+
+
+class MixedTypesReader(FakeReader):
+    def read_page_table(self, page, columns=None, filters=None):
+        value = page["number"] if page["number"] % 2 == 0 else str(page["number"])
+        return pa.table({"x": [value]})
+
+
+def test_get_dataframe_with_mixed_page_types():
+    loader = TomeLoader(reader=MixedTypesReader(3), has_header=False)
+    df = loader.get_dataframe()
+    assert list(df["x"]) == [0, "1", 2]
+    assert list(df.index) == [0, 1, 2]
+    with pytest.raises(pa.ArrowTypeError):
+        loader.get_dataframe(as_arrow=True)
+
+
+class FramesReader(FakeReader):
+    def __init__(self, frames):
+        super().__init__(len(frames))
+        self.frames = frames
+
+    def read_page_dataframe(self, page, columns=None, filters=None):
+        self.reads.append((page["number"], columns))
+        return self.frames[page["number"]][columns]
+
+
+def test_aggregate_matches_groupby():
+    rng = np.random.default_rng(1)
+    frames = [
+        pd.DataFrame(
+            {
+                "map": rng.choice(["a", "b", None], 40),
+                "round": rng.integers(0, 3, 40),
+                "value": rng.normal(size=40),
+                "unused": 0,
+            }
+        )
+        for _ in range(6)
+    ]
+    reader = FramesReader(frames)
+    loader = TomeLoader(reader=reader, has_header=False)
+
+    df = loader.aggregate(
+        ["map", "round"],
+        {
+            "total": ("value", "sum"),
+            "count": ("value", "count"),
+            "mean": ("value", "mean"),
+            "low": ("value", "min"),
+            "high": ("value", "max"),
+            "median": ("value", "quantile", 0.5),
+        },
+        max_workers=3,
+    )
+
+    expected = (
+        pd.concat(frames, ignore_index=True)
+        .groupby(["map", "round"], dropna=False)
+        .agg(
+            total=("value", "sum"),
+            count=("value", "count"),
+            mean=("value", "mean"),
+            low=("value", "min"),
+            high=("value", "max"),
+            median=("value", "median"),
+        )
+        .reset_index()
+    )
+    pd.testing.assert_frame_equal(df, expected)
+    assert {tuple(columns) for _, columns in reader.reads} == {
+        ("map", "round", "value")
+    }
+
+
+def test_aggregate_quantile_sketch_is_bounded():
+    frames = [pd.DataFrame({"map": "a", "value": np.arange(100.0)})] * 4
+    loader = TomeLoader(reader=FramesReader(frames), has_header=False)
+
+    df = loader.aggregate(
+        "map", {"p90": ("value", "quantile", 0.9)}, sketch_size=50, seed=1
+    )
+
+    assert 70 <= df["p90"].iloc[0] <= 99
+    with pytest.raises(Exception, match="Unsupported aggregation median"):
+        loader.aggregate("map", {"m": ("value", "median")})
@@ -1,9 +1,12 @@
 import time
+from contextlib import closing
+from functools import partial
 import structlog
 import pandas as pd
 
 from ..ds_io import DsReaderFs, GameDsLoader
 from .constants import filter_ds_reader_logs
+from .concurrency import map_ordered, add_log_option
 
 
 class TomeMaker:
@@ -21,6 +24,8 @@ class TomeMaker:
         behavior_if_partial="continue",
         print_status_frequency=100,
         reader_class=DsReaderFs,
+        workers=1,
+        map_fn=None,
         log: object = None,
     ):
         self.is_started = False
@@ -38,35 +43,82 @@ class TomeMaker:
         self._if_partial = behavior_if_partial
         self._print_status_frequency = print_status_frequency
         self._reader_class = reader_class
+        self._workers = workers
+        self._map_fn = map_fn
         self._current_key = None
+        self._is_continued = False
         self._loaded = False
         self._ds_collection_root_path = ds_collection_root_path
 
     def iterate(self):
         """Get data for the next key"""
-        self._load()
-        if len(self.keyset) == 0:
-            return
-        self._scribe.start()
-        self._log = structlog.wrap_logger(self._log, processors=[filter_ds_reader_logs])
-
-        start_time = time.time()
-        key_counter = 0
-        for key in self.keyset:
-            self._current_key = key
-            data = self._get_ds_channels_from_fs(key)
+        for key, data in self._process_keys():
             yield data, key
-            self._log_status(key_counter, start_time)
-            key_counter += 1
 
-        self._finish()
+    def run(self):
+        """Make the tome by passing the data for every key to map_fn"""
+        if self._map_fn is None:
+            raise Exception("TomeMaker.run requires a map_fn")
+        for key, df in self._process_keys(self._map_fn):
+            self._scribe.concat(df, key)
 
-    def concat(self, df: pd.DataFrame):
-        """Append a dataframe to tome dataset"""
-        self._scribe.concat(df, self._current_key)
+    @property
+    def ds_reading_instructions(self):
+        return self._ds_reading_instructions
+
+    def concat(self, df: pd.DataFrame, key=None):
+        """Append a dataframe to tome dataset, for the current key by default"""
+        self._scribe.concat(df, self._current_key if key is None else key)
+
+    def end_key(self):
+        """Mark the data of the current key as complete"""
+        self._scribe.end_key()
+
+    def start(self):
+        """Load the keys left to add and start the tome.
+
+        Returns False when there is nothing to add.
+        """
+        self._load()
+        # A continued tome is finished even if only journaled keys were left
+        if len(self.keyset) == 0 and not self._is_continued:
+            return False
+        self._scribe.start()
+        self.is_started = True
+        return True
 
-    def _finish(self):
+    def finish(self):
         self._scribe.finish()
+        self.is_finished = True
+
+    def _process_keys(self, map_fn=None):
+        if not self.start():
+            return
+        self._log = structlog.wrap_logger(self._log, processors=[filter_ds_reader_logs])
+        fn = self._get_key_processor(map_fn)
+
+        start_time = time.time()
+        with closing(map_ordered(fn, self.keyset, self._workers)) as results:
+            for key_counter, (key, result) in enumerate(zip(self.keyset, results)):
+                self._current_key = key
+                yield key, result
+                # The caller asked for the next key, so this one is complete
+                self.end_key()
+                self._log_status(key_counter, start_time)
+
+        self.finish()
+
+    def _get_key_processor(self, map_fn):
+        options = {
+            "root_path": self._ds_collection_root_path,
+            "ds_reading_instructions": self._ds_reading_instructions,
+            "reader_class": self._reader_class,
+        }
+        if map_fn is not None:
+            options["map_fn"] = map_fn
+        add_log_option(options, self._log, self._workers)
+        fn = read_ds_channels if map_fn is None else read_and_map_ds_channels
+        return partial(fn, **options)
 
     def _log_status(self, key_counter: int, start_time: float):
         if key_counter % self._print_status_frequency == 0 and key_counter > 0:
@@ -88,25 +140,17 @@ class TomeMaker:
             }
             self._log.info("Tome Maker Update:", **meta)
 
-    def _get_ds_channels_from_fs(self, key):
-        root_path = self._ds_collection_root_path
-        manifest_key = key
-        ds_reader = self._reader_class(
-            root_path=root_path,
-            manifest_key=manifest_key,
-            log=self._log,
-        )
-        ds_loader = GameDsLoader(reader=ds_reader, log=self._log)
-        data = ds_loader.get_channels(self._ds_reading_instructions)
-        return data
-
     def _load_actions(self):
         def continue_tome():
             self._header_dataframe = self._existing_tome_loader.header.get_dataframe()
-            existing_keyset = self._existing_tome_loader.get_keyset()
-            target_keyset = self._existing_tome_loader.header.get_keyset()
-            self.keyset = list(set(target_keyset) - set(existing_keyset))
             self._scribe.set_manifest_data(self._existing_tome_loader.manifest)
+            self._scribe.set_key_index(self._existing_tome_loader.get_key_index())
+            done_keys = set(self._existing_tome_loader.get_keyset())
+            done_keys.update(self._scribe.get_journaled_keys())
+            target_keyset = self._existing_tome_loader.header.get_keyset()
+            # Keep the header order so the remaining keys are read in sequence
+            self.keyset = [key for key in target_keyset if key not in done_keys]
+            self._is_continued = True
 
         def overwrite():
             self._header_dataframe = self._header_loader.get_dataframe()
@@ -151,3 +195,28 @@ class TomeMaker:
 
     def _copy_header(self):
         self._header_copier.copy()
+
+
+def read_ds_channels(
+    key, *, root_path, ds_reading_instructions, reader_class=DsReaderFs, log=None
+):
+    log = (
+        log
+        if log is not None
+        else structlog.wrap_logger(
+            structlog.get_logger(), processors=[filter_ds_reader_logs]
+        )
+    )
+    ds_reader = reader_class(
+        root_path=root_path,
+        manifest_key=key,
+        log=log,
+    )
+    ds_loader = GameDsLoader(reader=ds_reader, log=log)
+    data = ds_loader.get_channels(ds_reading_instructions)
+    return data
+
+
+def read_and_map_ds_channels(key, *, map_fn, **kwargs):
+    data = read_ds_channels(key, **kwargs)
+    return map_fn(data, key)
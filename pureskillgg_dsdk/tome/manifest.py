@@ -15,12 +15,16 @@ class TomeManifest:
         header_tome_name=None,
         src_id=None,
         is_copied_header=False,
+        partition_by=None,
+        parquet_options=None,
+        generation=None,
         log=None,
     ):
         self._log = log if log is not None else structlog.get_logger()
         self._tome_name = tome_name
         self._ds_type = ds_type
         self._is_copied_header = is_copied_header
+        self._generation = generation
         self._data = create_manifest(
             self._tome_name,
             self._ds_type,
@@ -29,6 +33,12 @@ class TomeManifest:
             src_id,
             is_copied_header=self._is_copied_header,
         )
+        if partition_by is not None:
+            self._data["partitionBy"] = partition_by
+        if parquet_options is not None:
+            self._data["parquet"] = parquet_options
+        if generation is not None:
+            self._data["generation"] = generation
         self._current_page_start_time = None
         self._current_page_end_time = None
 
@@ -38,7 +48,7 @@ class TomeManifest:
     def start_page(self):
         self._current_page_start_time = now()
 
-    def end_page(self, page_number):
+    def end_page(self, page_number, statistics=None, partition=None):
         self._current_page_end_time = now()
         page = {
             "number": page_number,
@@ -50,6 +60,7 @@ class TomeManifest:
                         self._ds_type,
                         self._tome_name,
                         "header" if self._is_copied_header else "",
+                        self._get_generation_name(),
                         content_name(page_number, "keyset"),
                     ]
                 ),
@@ -63,6 +74,7 @@ class TomeManifest:
                         self._ds_type,
                         self._tome_name,
                         "header" if self._is_copied_header else "",
+                        self._get_generation_name(),
                         content_name(page_number, "dataframe"),
                     ]
                 ),
@@ -71,9 +83,30 @@ class TomeManifest:
             "createdAt": now_to_iso(),
             "timings": self._calculate_end_page_timings(),
         }
+        if statistics is not None:
+            page["statistics"] = statistics
+        if partition is not None:
+            page["partition"] = partition
         self._data["pages"].append(page)
         return page
 
+    def add_key_index(self):
+        key_index = {
+            "key": make_key(
+                [
+                    "tome",
+                    self._ds_type,
+                    self._tome_name,
+                    "header" if self._is_copied_header else "",
+                    self._get_generation_name(),
+                    "key_index",
+                ]
+            ),
+            "contentType": "application/x-parquet",
+        }
+        self._data["keyIndex"] = key_index
+        return key_index
+
     def finish(self):
         self._data["isComplete"] = True
         self._data["timings"] = self._sum_page_timings()
@@ -82,6 +115,12 @@ class TomeManifest:
     def get(self):
         return self._data
 
+    def _get_generation_name(self):
+        # Pages of a compacted tome do not overwrite the pages they replace
+        if self._generation is None:
+            return None
+        return content_name(self._generation, "generation")
+
     def _sum_page_timings(self):
         timings = {
             "seconds": 0,
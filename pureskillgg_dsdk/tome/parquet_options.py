@@ -0,0 +1,42 @@
+PARQUET_COMPRESSIONS = ["gzip", "zstd", "lz4", "snappy", "none"]
+
+
+def create_parquet_options(
+    *,
+    compression="gzip",
+    compression_level=None,
+    row_group_size=None,
+    use_dictionary=True,
+):
+    """Parquet settings of a tome, in the form recorded in its manifest"""
+    if compression not in PARQUET_COMPRESSIONS:
+        raise Exception(f"Unsupported parquet compression {compression}")
+    return {
+        "compression": compression,
+        "compressionLevel": compression_level,
+        "rowGroupSize": row_group_size,
+        "useDictionary": use_dictionary,
+    }
+
+
+# Row groups of tomes with cluster_by, whose statistics can then skip data
+DEFAULT_CLUSTER_ROW_GROUP_SIZE = 10_000
+
+# Tomes written before the options were recorded use these
+DEFAULT_PARQUET_OPTIONS = create_parquet_options()
+
+
+def get_parquet_write_kwargs(options):
+    """Keyword arguments for DataFrame.to_parquet"""
+    options = {**DEFAULT_PARQUET_OPTIONS, **(options or {})}
+    kwargs = {
+        "compression": (
+            None if options["compression"] == "none" else options["compression"]
+        ),
+        "use_dictionary": options["useDictionary"],
+    }
+    if options["compressionLevel"] is not None:
+        kwargs["compression_level"] = options["compressionLevel"]
+    if options["rowGroupSize"] is not None:
+        kwargs["row_group_size"] = options["rowGroupSize"]
+    return kwargs
@@ -1,10 +1,14 @@
 import os
 from pathlib import Path
 import pandas as pd
+import pyarrow.parquet as pq
 import structlog
 import rapidjson
 from .constants import (
     get_page_path_fs,
+    get_key_rows,
+    get_page_log_key,
+    merge_page_log,
 )
 
 
@@ -61,7 +65,9 @@ class TomeReaderFs:
 
         with open(file_location, "r", encoding="utf-8") as file:
             data = rapidjson.loads(file.read())
-        return data
+        if data.get("isComplete", False):
+            return data
+        return merge_page_log(data, self._read_page_log())
 
     def read_metadata(self):
         return {}
@@ -82,7 +88,29 @@ class TomeReaderFs:
         df = pd.read_parquet(key)
         return list(df.iloc[:, 0])
 
-    def read_page_dataframe(self, page):
+    def read_page_key_rows(self, page):
+        """Keyset of a page with the row range of each key (None if unknown)"""
+        key = self._get_page_key("keyset", page)
+
+        content_type = page["keyset"]["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unknown content type {content_type}")
+
+        self._log.info("Read key rows: Start", page_number=page["number"])
+        df = pd.read_parquet(key)
+        return get_key_rows(df)
+
+    def read_key_index(self, key_index):
+        key = self._get_key(key_index)
+
+        content_type = key_index["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unsupported content type {content_type}")
+
+        self._log.info("Read Key Index: Start")
+        return pd.read_parquet(key)
+
+    def read_page_dataframe(self, page, columns=None, filters=None):
         key = self._get_page_key("dataframe", page)
 
         content_type = page["dataframe"]["contentType"]
@@ -90,12 +118,42 @@ class TomeReaderFs:
             raise Exception(f"Unsupported content type {content_type}")
 
         self._log.info("Read Dataframe: Start", page_number=page["number"])
-        df = pd.read_parquet(key)
+        df = pd.read_parquet(key, columns=columns, filters=filters)
         return df
 
+    def read_page_table(self, page, columns=None, filters=None):
+        key = self._get_page_key("dataframe", page)
+
+        content_type = page["dataframe"]["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unsupported content type {content_type}")
+
+        self._log.info("Read Table: Start", page_number=page["number"])
+        return pq.read_table(key, columns=columns, filters=filters)
+
     def _get_page_key(self, subtype, page):
         return get_page_path_fs(self._root_path, subtype, page)
 
+    def _get_key(self, entry):
+        return os.path.join(self._root_path, entry["key"])
+
+    def _read_page_log(self):
+        file_location = os.path.join(
+            self._root_path,
+            add_prefix(get_page_log_key(self._manifest_key) + ".jsonl", self._prefix),
+        )
+        if not os.path.exists(file_location):
+            return []
+        entries = []
+        with open(file_location, "r", encoding="utf-8") as file:
+            for line in file:
+                try:
+                    entries.append(rapidjson.loads(line))
+                except ValueError:
+                    # A page that was being logged during a crash
+                    continue
+        return entries
+
 
 def add_prefix(key, prefix, /) -> str:
     if prefix is None:
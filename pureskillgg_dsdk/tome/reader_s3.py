@@ -0,0 +1,177 @@
+from pathlib import PurePosixPath
+import pandas as pd
+import pyarrow.parquet as pq
+import structlog
+import rapidjson
+import boto3
+from pyarrow import fs
+
+from .constants import (
+    get_page_key_s3,
+    add_s3_prefix,
+    get_key_rows,
+    get_page_log_key,
+    merge_page_log,
+)
+
+
+class TomeReaderS3:
+    def __init__(
+        self,
+        *,
+        bucket,
+        prefix=None,
+        manifest_key,
+        has_header=True,
+        filesystem=None,
+        log=None,
+    ):
+        self._log = log if log is not None else structlog.get_logger()
+        self._log = self._log.bind(
+            client="tome_reader_s3",
+            bucket=bucket,
+            prefix=prefix,
+            manifest_key=manifest_key,
+        )
+
+        self._bucket = bucket
+        self._prefix = prefix
+        self._manifest_key = manifest_key
+        self._s3_client = boto3.client("s3")
+        self._filesystem = filesystem
+        self.has_header = has_header
+        self.header = None
+        if self.has_header:
+            self.header = TomeReaderS3(
+                bucket=self._bucket,
+                prefix=self._prefix,
+                manifest_key="/".join(
+                    [str(PurePosixPath(self._manifest_key).parent), "header", "tome"]
+                ),
+                has_header=False,
+                filesystem=filesystem,
+                log=self._log,
+            )
+
+    @property
+    def exists(self):
+        """If the tome exists"""
+        try:
+            self.read_manifest()
+        except self._s3_client.exceptions.NoSuchKey:
+            return False
+        except:
+            self._log.error("There was an error while loading the loader")
+            raise
+        return True
+
+    def read_manifest(self):
+        self._log.info("Read Manifest: Start")
+        key = add_s3_prefix(self._manifest_key, self._prefix)
+        data = self._read_json(key)
+        if data.get("isComplete", False):
+            return data
+        return merge_page_log(data, self._read_page_log())
+
+    def read_metadata(self):
+        return {}
+
+    def read_page(self, page):
+        dataframe = self.read_page_dataframe(page)
+        keyset = self.read_page_keyset(page)
+        return dataframe, keyset
+
+    def read_page_keyset(self, page):
+        key = self._get_page_key("keyset", page)
+
+        content_type = page["keyset"]["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unknown content type {content_type}")
+
+        self._log.info("Read keyset: Start", page_number=page["number"])
+        df = self._read_parquet(key)
+        return list(df.iloc[:, 0])
+
+    def read_page_key_rows(self, page):
+        """Keyset of a page with the row range of each key (None if unknown)"""
+        key = self._get_page_key("keyset", page)
+
+        content_type = page["keyset"]["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unknown content type {content_type}")
+
+        self._log.info("Read key rows: Start", page_number=page["number"])
+        df = self._read_parquet(key)
+        return get_key_rows(df)
+
+    def read_key_index(self, key_index):
+        key = self._get_key(key_index)
+
+        content_type = key_index["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unsupported content type {content_type}")
+
+        self._log.info("Read Key Index: Start")
+        return self._read_parquet(key)
+
+    def read_page_dataframe(self, page, columns=None, filters=None):
+        key = self._get_page_key("dataframe", page)
+
+        content_type = page["dataframe"]["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unsupported content type {content_type}")
+
+        self._log.info("Read Dataframe: Start", page_number=page["number"])
+        df = self._read_parquet(key, columns=columns, filters=filters)
+        return df
+
+    def read_page_table(self, page, columns=None, filters=None):
+        key = self._get_page_key("dataframe", page)
+
+        content_type = page["dataframe"]["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unsupported content type {content_type}")
+
+        self._log.info("Read Table: Start", page_number=page["number"])
+        return pq.read_table(
+            f"{self._bucket}/{key}",
+            filesystem=self._get_filesystem(),
+            columns=columns,
+            filters=filters,
+            pre_buffer=True,
+        )
+
+    def _get_page_key(self, subtype, page):
+        return get_page_key_s3(self._prefix, subtype, page)
+
+    def _get_key(self, entry):
+        return add_s3_prefix(entry["key"], self._prefix)
+
+    def _get_filesystem(self):
+        if self._filesystem is None:
+            self._filesystem = fs.S3FileSystem()
+        return self._filesystem
+
+    def _read_parquet(self, key, **kwargs):
+        # Arrow reads the footer and then only the column chunks it needs
+        # with concurrent ranged GETs (pre_buffer).
+        return pd.read_parquet(
+            f"{self._bucket}/{key}",
+            filesystem=self._get_filesystem(),
+            pre_buffer=True,
+            **kwargs,
+        )
+
+    def _read_json(self, key):
+        res = self._s3_client.get_object(Bucket=self._bucket, Key=key)
+        return rapidjson.loads(res["Body"].read().decode("utf-8"))
+
+    def _read_page_log(self):
+        prefix = add_s3_prefix(get_page_log_key(self._manifest_key), self._prefix)
+        paginator = self._s3_client.get_paginator("list_objects_v2")
+        keys = [
+            item["Key"]
+            for response in paginator.paginate(Bucket=self._bucket, Prefix=prefix + "/")
+            for item in response.get("Contents", [])
+        ]
+        return [self._read_json(key) for key in sorted(keys)]
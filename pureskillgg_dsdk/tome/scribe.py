@@ -1,6 +1,10 @@
 import structlog
+import numpy as np
 import pandas as pd
 
+from .background_writer import TomeBackgroundWriter
+from .statistics import get_page_statistics
+
 
 class TomeScribe:
     def __init__(
@@ -10,26 +14,50 @@ class TomeScribe:
         writer,
         max_page_size_mb=None,
         max_page_row_count=None,
-        limit_check_frequency=100,
+        limit_check_frequency=1,
+        background_write=False,
+        max_pending_writes=2,
+        manifest_compaction_frequency=100,
+        defer_manifest=False,
+        cluster_by=None,
+        journal=None,
         log: object = None,
     ):
         self._log = log if log is not None else structlog.get_logger()
         self._manifest = manifest
-        self._writer = writer
+        self._writer = (
+            TomeBackgroundWriter(
+                writer=writer, max_pending_writes=max_pending_writes, log=self._log
+            )
+            if background_write
+            else writer
+        )
+        self._background_write = background_write
         self._max_page_size_mb = max_page_size_mb
         self._max_page_row_count = max_page_row_count
         self._limit_check_frequency = limit_check_frequency
+        self._manifest_compaction_frequency = manifest_compaction_frequency
+        # Only write the manifest on finish, e.g. to replace an existing tome
+        self._defer_manifest = defer_manifest
+        self._cluster_by = cluster_by
+        self._journal = journal
+        self._is_resumed = False
 
-        self._data_dict = {}
-        self._data_dict_index = 0
+        self._data_chunks = []
         self._keyset = []
+        self._key_rows = []
+        self._key_index = []
         self._data_df = None
         self._page_counter = 0
+        self._page_row_count = 0
+        self._page_size_bytes = 0
+        self._partition = None
 
     @property
     def dataframe(self):
         if self._data_df is None:
-            self._data_df = pd.DataFrame.from_dict(self._data_dict, "index")
+            self._data_df = concat_chunks(self._data_chunks)
+            self._data_chunks = [self._data_df] if len(self._data_df) > 0 else []
         return self._data_df
 
     @property
@@ -52,34 +80,172 @@ class TomeScribe:
     def page_row_count(self):
         return self._get_page_row_count()
 
+    def get_page_row_capacity(self, df):
+        """Number of leading rows of df that fit in the current page.
+
+        The size limit is checked with the average row size of df.
+        """
+        capacity = len(df)
+        if self._max_page_row_count is not None:
+            capacity = min(
+                capacity, self._max_page_row_count - self._get_page_row_count()
+            )
+        if self._max_page_size_mb is not None and len(df) > 0:
+            row_size_mb = get_size_mb(df) / len(df)
+            if row_size_mb > 0:
+                free_mb = self._max_page_size_mb - self._get_page_size_mb()
+                capacity = min(capacity, int(free_mb / row_size_mb))
+        return max(capacity, 0)
+
     def start(self):
-        self._writer.write_manifest(self._manifest.get())
+        if not self._defer_manifest:
+            self._writer.write_manifest(self._manifest.get())
         self._manifest.start_page()
+        if self._journal is not None:
+            self._restore_journal()
 
     def finish(self):
         if self._page_counter == 0 and len(self._keyset) == 0:
             raise Exception("Empty Tome not supported")
         if len(self._keyset) > 0:
             self._write()
+        key_index = self._manifest.add_key_index()
+        self._writer.write_key_index(key_index, self._get_key_index_dataframe())
         self._manifest.finish()
         self._writer.write_manifest(self._manifest.get())
+        self._flush()
+        if self._journal is not None:
+            self._journal.remove()
+
+    def concat(self, df, keys, partition=None, key_rows=None):
+        """Append df for keys, starting a new page when partition changes.
 
-    def concat(self, df, keys):
-        self._concat_keys(keys)
+        Every key spans all rows of df unless key_rows gives the row range of
+        each key within df, e.g. one row per key for header tomes.
+        """
+        if self._will_overflow_page(df) or self._will_change_partition(partition):
+            self._write()
+        self._partition = partition
+        self._concat_keys(keys, df, key_rows)
         self._concat_df(df)
+        if self._journal is not None:
+            self._journal.append(keys, df, self._page_counter, partition, key_rows)
         self._on_data()
 
+    def end_key(self):
+        """Journal that all data of the keys added since the last end is in"""
+        if self._journal is not None:
+            self._journal.end_key()
+
+    def write_page(self, df, keys, key_rows, partition=None):
+        """Write df as a page of its own, with the row range of each key"""
+        if len(self._keyset) > 0:
+            self._write()
+        self._partition = partition
+        self._keyset = list(keys)
+        self._key_rows = list(key_rows)
+        self._concat_df(df)
+        self._write()
+
     def set_manifest_data(self, data):
         self._page_counter = len(data["pages"])
         self._manifest.set(data)
+        if "parquet" in data:
+            # Continued pages are written like the pages before them
+            self._writer.set_parquet_options(data["parquet"])
+        self._is_resumed = True
+
+    def get_journaled_keys(self):
+        """Keys of unwritten pages that will be restored from the journal"""
+        keys = []
+        for entry in self._get_restorable_entries():
+            keys += (
+                entry["keys"] if isinstance(entry["keys"], list) else [entry["keys"]]
+            )
+        return keys
+
+    def set_key_index(self, df):
+        """Key index of the pages already in the manifest when resuming"""
+        self._key_index = list(
+            df[["key", "page", "row_start", "row_stop"]].itertuples(
+                index=False, name=None
+            )
+        )
 
     def _write(self):
-        page = self._manifest.end_page(self._page_counter)
-        self._writer.write_page(page, self.dataframe, self.keyset)
-        self._writer.write_manifest(self._manifest.get())
+        if self._cluster_by is not None:
+            self._cluster_page()
+        page = self._manifest.end_page(
+            self._page_counter,
+            get_page_statistics(self.dataframe, self.keyset),
+            partition=self._partition,
+        )
+        self._writer.write_page(
+            page, self.dataframe, self.keyset, key_rows=self._key_rows
+        )
+        if not self._defer_manifest:
+            self._write_manifest_page(page)
+        if self._journal is not None:
+            self._end_journal_pages()
+        self._key_index += [
+            (key, self._page_counter, row_start, row_stop)
+            for key, (row_start, row_stop) in zip(self._keyset, self._key_rows)
+        ]
         self._page_counter += 1
         self._new_page()
 
+    def _end_journal_pages(self):
+        # Chunks are only removed once the manifest lists their page
+        if not self._background_write:
+            self._journal.end_page(self._page_counter)
+            return
+        for page_number in self._writer.pop_committed_pages():
+            self._journal.end_page(page_number)
+
+    def _cluster_page(self):
+        df, self._keyset, self._key_rows = cluster_page(
+            self.dataframe, self._keyset, self._key_rows, self._cluster_by
+        )
+        self._data_df = df
+        self._data_chunks = [df] if len(df) > 0 else []
+
+    def _write_manifest_page(self, page):
+        # Pages are appended to the page log, the whole manifest is only
+        # rewritten every manifest_compaction_frequency pages
+        if (self._page_counter + 1) % self._manifest_compaction_frequency == 0:
+            self._writer.write_manifest(self._manifest.get())
+        else:
+            self._writer.write_manifest_page(self._manifest.get(), page)
+
+    def _get_restorable_entries(self):
+        if self._journal is None or not self._is_resumed:
+            return []
+        return [
+            entry
+            for entry in self._journal.read()
+            if entry["page"] >= self._page_counter
+        ]
+
+    def _restore_journal(self):
+        entries = self._get_restorable_entries()
+        chunks = [(entry, self._journal.read_chunk(entry)) for entry in entries]
+        self._journal.reset()
+        if len(chunks) > 0:
+            self._log.info("Restore Journal: Start", chunk_count=len(chunks))
+        for entry, df in chunks:
+            self.concat(
+                df,
+                entry["keys"],
+                partition=entry.get("partition"),
+                key_rows=entry.get("key_rows"),
+            )
+        if len(chunks) > 0:
+            self.end_key()
+
+    def _flush(self):
+        if self._background_write:
+            self._writer.close()
+
     def _on_data(self):
         if self._will_write_page():
             self._write()
@@ -91,41 +257,139 @@ class TomeScribe:
             return False
         if self._max_page_size_mb is not None:
             current_size = self._get_page_size_mb()
-            if current_size > self._max_page_size_mb:
+            if current_size >= self._max_page_size_mb:
                 return True
         if self._max_page_row_count is not None:
             current_row_count = self._get_page_row_count()
-            if current_row_count > self._max_page_row_count:
+            if current_row_count >= self._max_page_row_count:
                 return True
         return False
 
+    def _will_overflow_page(self, df) -> bool:
+        if len(self.keyset) == 0 or df is None:
+            return False
+        if self._max_page_size_mb is not None:
+            next_size = self._get_page_size_mb() + get_size_mb(df)
+            if next_size > self._max_page_size_mb:
+                return True
+        if self._max_page_row_count is not None:
+            next_row_count = self._get_page_row_count() + len(df)
+            if next_row_count > self._max_page_row_count:
+                return True
+        return False
+
+    def _will_change_partition(self, partition) -> bool:
+        return len(self.keyset) > 0 and partition != self._partition
+
     def _new_page(self) -> None:
         self._keyset = []
-        self._data_dict = {}
-        self._data_dict_index = 0
+        self._key_rows = []
+        self._data_chunks = []
         self._data_df = None
+        self._page_row_count = 0
+        self._page_size_bytes = 0
         self._manifest.start_page()
 
     def _concat_df(self, df):
-        if df is not None:
+        if df is not None and len(df) > 0:
             self._data_df = None
-            temp_dict = df.to_dict(orient="records")
-            for entry in temp_dict:
-                self._data_dict[self._data_dict_index] = entry
-                self._data_dict_index += 1
-
-    def _concat_keys(self, keys):
-        if isinstance(keys, list):
-            self._keyset += keys
-        else:
-            self._keyset.append(keys)
+            self._data_chunks.append(df)
+            self._page_row_count += len(df)
+            self._page_size_bytes += get_size_bytes(df)
+
+    def _concat_keys(self, keys, df, key_rows):
+        row_start = self._page_row_count
+        row_count = 0 if df is None else len(df)
+        if not isinstance(keys, list):
+            keys = [keys]
+        if key_rows is None:
+            key_rows = [(0, row_count)] * len(keys)
+        elif len(key_rows) != len(keys):
+            raise Exception("key_rows must have one row range per key")
+        self._keyset += keys
+        self._key_rows += [
+            (row_start + key_start, row_start + key_stop)
+            for key_start, key_stop in key_rows
+        ]
+
+    def _get_key_index_dataframe(self):
+        return pd.DataFrame(
+            self._key_index, columns=["key", "page", "row_start", "row_stop"]
+        )
 
     def _get_page_size_mb(self) -> float:
-        df = self.dataframe
-        size_in_mb = sum(df.memory_usage()) / 1024 / 1024
-        return size_in_mb
+        return self._page_size_bytes / 1024 / 1024
 
     def _get_page_row_count(self) -> int:
-        df = self.dataframe
-        row_count = df.shape[0]
-        return row_count
+        return self._page_row_count
+
+
+def get_size_bytes(df) -> int:
+    return int(df.memory_usage(index=False).sum())
+
+
+def get_size_mb(df) -> float:
+    return get_size_bytes(df) / 1024 / 1024
+
+
+def get_row_per_key(row_count):
+    """key_rows for a dataframe with one row per key"""
+    return [(row, row + 1) for row in range(row_count)]
+
+
+def cluster_page(df, keyset, key_rows, cluster_by):
+    """Order the keys of a page by the cluster_by values of their first row.
+
+    The rows of a key stay together, so their row ranges are moved along.
+    Keys without rows go last.
+    """
+    if len(df) == 0:
+        return df, keyset, key_rows
+    for column in cluster_by:
+        if column not in df.columns:
+            raise Exception(f"Cluster column {column} is not in the page")
+    chunks = pd.DataFrame(key_rows, columns=["row_start", "row_stop"])
+    # Keys added together share their row range
+    chunks["chunk"] = chunks.groupby(["row_start", "row_stop"], sort=False).ngroup()
+    ranges = chunks.drop_duplicates("chunk").set_index("chunk")
+    chunk_keys = {}
+    for key, chunk in zip(keyset, chunks["chunk"]):
+        chunk_keys.setdefault(chunk, []).append(key)
+
+    positions = []
+    clustered_keyset = []
+    clustered_key_rows = []
+    row_start = 0
+    for chunk in get_cluster_order(df, ranges, cluster_by):
+        chunk_positions = np.arange(
+            ranges.at[chunk, "row_start"], ranges.at[chunk, "row_stop"]
+        )
+        positions.append(chunk_positions)
+        clustered_keyset += chunk_keys[chunk]
+        clustered_key_rows += [(row_start, row_start + len(chunk_positions))] * len(
+            chunk_keys[chunk]
+        )
+        row_start += len(chunk_positions)
+    return (
+        df.iloc[np.concatenate(positions)].reset_index(drop=True),
+        clustered_keyset,
+        clustered_key_rows,
+    )
+
+
+def get_cluster_order(df, ranges, cluster_by):
+    """Chunks ordered by the cluster_by values of their first row"""
+    has_rows = ranges[ranges["row_stop"] > ranges["row_start"]]
+    values = (
+        df[cluster_by]
+        .iloc[has_rows["row_start"].to_numpy()]
+        .set_axis(has_rows.index, axis=0)
+        .reindex(ranges.index)
+    )
+    return values.sort_values(cluster_by, kind="stable", na_position="last").index
+
+
+def concat_chunks(chunks):
+    if len(chunks) == 0:
+        return pd.DataFrame()
+    return pd.concat(chunks, ignore_index=True)
@@ -0,0 +1,319 @@
+# pylint: disable=missing-docstring,unused-argument
+import copy
+import os
+import threading
+import pytest
+import pandas as pd
+from .scribe import TomeScribe
+from .manifest import TomeManifest
+from .journal import TomeJournalFs
+from .constants import merge_page_log
+
+# pylint: disable=invalid-name
+tome_name = "scribe_test.1234-56-78,1234-56-78"
+
+
+class FakeWriter:
+    def __init__(self):
+        self.pages = []
+        self.manifests = []
+        self.manifest_pages = []
+        self.key_index = None
+
+    def write_manifest(self, manifest):
+        self.manifests.append(copy.deepcopy(manifest))
+
+    def write_manifest_page(self, manifest, page):
+        self.manifest_pages.append(page)
+
+    def write_page(self, page, dataframe, keyset, key_rows=None):
+        self.pages.append((page, dataframe, list(keyset)))
+
+    def write_key_index(self, key_index, df):
+        self.key_index = df
+
+
+def create_scribe(writer, **kwargs):
+    manifest = TomeManifest(tome_name=tome_name, ds_type="csds")
+    return TomeScribe(manifest=manifest, writer=writer, **kwargs)
+
+
+def test_concat_matches_row_records():
+    writer = FakeWriter()
+    scribe = create_scribe(writer)
+    first = pd.DataFrame({"x": [1, 2], "y": ["a", "b"]}, index=[5, 6])
+    second = pd.DataFrame({"x": [3], "z": [1.5]})
+
+    scribe.start()
+    scribe.concat(first, "key_1")
+    scribe.concat(pd.DataFrame({"x": []}), "key_2")
+    scribe.concat(None, "key_3")
+    scribe.concat(second, "key_4")
+    scribe.finish()
+
+    expected = pd.DataFrame(
+        {"x": [1, 2, 3], "y": ["a", "b", float("nan")], "z": [None, None, 1.5]}
+    )
+    _, dataframe, keyset = writer.pages[0]
+    assert keyset == ["key_1", "key_2", "key_3", "key_4"]
+    pd.testing.assert_frame_equal(dataframe, expected)
+
+
+def test_dataframe_is_reused_between_concats():
+    writer = FakeWriter()
+    scribe = create_scribe(writer)
+
+    scribe.start()
+    scribe.concat(pd.DataFrame({"x": [1]}), "key_1")
+    assert scribe.dataframe.shape == (1, 1)
+    scribe.concat(pd.DataFrame({"x": [2]}), "key_2")
+    assert list(scribe.dataframe["x"]) == [1, 2]
+
+
+def test_page_row_limit_splits_before_overflow():
+    writer = FakeWriter()
+    scribe = create_scribe(writer, max_page_row_count=4)
+
+    scribe.start()
+    for index in range(5):
+        scribe.concat(pd.DataFrame({"x": [index, index]}), f"key_{index}")
+    scribe.finish()
+
+    assert [len(df) for _, df, _ in writer.pages] == [4, 4, 2]
+    assert [keys for _, _, keys in writer.pages] == [
+        ["key_0", "key_1"],
+        ["key_2", "key_3"],
+        ["key_4"],
+    ]
+
+
+def test_page_size_is_tracked_incrementally():
+    writer = FakeWriter()
+    scribe = create_scribe(writer)
+    df = pd.DataFrame({"x": range(1000)})
+
+    scribe.start()
+    scribe.concat(df, "key_1")
+    scribe.concat(df, "key_2")
+
+    assert scribe.page_row_count == 2000
+    assert scribe.page_size_mb == 2 * df.memory_usage(index=False).sum() / 1024 / 1024
+
+
+class FailingWriter(FakeWriter):
+    def write_page(self, page, dataframe, keyset, key_rows=None):
+        raise OSError("disk full")
+
+
+def test_background_write_matches_sync_write():
+    writer = FakeWriter()
+    scribe = create_scribe(writer, max_page_row_count=2, background_write=True)
+    thread_count = threading.active_count()
+
+    scribe.start()
+    for index in range(5):
+        scribe.concat(pd.DataFrame({"x": [index]}), f"key_{index}")
+    assert threading.active_count() == thread_count + 1
+    scribe.finish()
+    assert threading.active_count() == thread_count
+
+    assert [keys for _, _, keys in writer.pages] == [
+        ["key_0", "key_1"],
+        ["key_2", "key_3"],
+        ["key_4"],
+    ]
+    assert [len(manifest["pages"]) for manifest in writer.manifests] == [0, 3]
+    assert [page["number"] for page in writer.manifest_pages] == [0, 1, 2]
+    assert writer.manifests[-1]["isComplete"] is True
+    assert writer.manifests[0]["isComplete"] is False
+
+
+def test_background_write_raises_errors():
+    scribe = create_scribe(FailingWriter(), max_page_row_count=1, background_write=True)
+
+    scribe.start()
+    with pytest.raises(OSError):
+        for index in range(5):
+            scribe.concat(pd.DataFrame({"x": [index]}), f"key_{index}")
+        scribe.finish()
+
+
+def test_key_index():
+    writer = FakeWriter()
+    scribe = create_scribe(writer, max_page_row_count=3)
+
+    scribe.start()
+    scribe.concat(pd.DataFrame({"x": [1, 2]}), "key_1")
+    scribe.concat(None, "key_2")
+    scribe.concat(
+        pd.DataFrame({"x": [3, 4]}), ["key_3", "key_4"], key_rows=[(0, 1), (1, 2)]
+    )
+    scribe.concat(pd.DataFrame({"x": [5, 6]}), ["key_5", "key_6", "key_7"])
+    scribe.finish()
+
+    assert list(writer.key_index.itertuples(index=False, name=None)) == [
+        ("key_1", 0, 0, 2),
+        ("key_2", 0, 2, 2),
+        ("key_3", 1, 0, 1),
+        ("key_4", 1, 1, 2),
+        ("key_5", 2, 0, 2),
+        ("key_6", 2, 0, 2),
+        ("key_7", 2, 0, 2),
+    ]
+    assert writer.manifests[-1]["keyIndex"]["key"].endswith("/key_index")
+
+
+def test_keys_share_rows_without_key_rows():
+    writer = FakeWriter()
+    scribe = create_scribe(writer)
+
+    scribe.start()
+    scribe.concat(pd.DataFrame({"x": [1, 2]}), ["key_1", "key_2"])
+    with pytest.raises(Exception, match="one row range per key"):
+        scribe.concat(pd.DataFrame({"x": [3]}), ["key_3", "key_4"], key_rows=[(0, 1)])
+    scribe.finish()
+
+    assert list(writer.key_index.itertuples(index=False, name=None)) == [
+        ("key_1", 0, 0, 2),
+        ("key_2", 0, 0, 2),
+    ]
+
+
+def test_partition_change_starts_page():
+    writer = FakeWriter()
+    scribe = create_scribe(writer)
+
+    scribe.start()
+    scribe.concat(pd.DataFrame({"x": [1]}), "key_1", partition="2022-05-15")
+    scribe.concat(pd.DataFrame({"x": [2]}), "key_2", partition="2022-05-15")
+    scribe.concat(pd.DataFrame({"x": [3]}), "key_3", partition="2022-05-16")
+    scribe.finish()
+
+    assert [keyset for _, _, keyset in writer.pages] == [
+        ["key_1", "key_2"],
+        ["key_3"],
+    ]
+    assert [page["partition"] for page, _, _ in writer.pages] == [
+        "2022-05-15",
+        "2022-05-16",
+    ]
+
+
+def test_journal_restores_unwritten_page(tmp_path):
+    path = os.path.join(tmp_path, "journal")
+    writer = FakeWriter()
+    scribe = create_scribe(
+        writer,
+        max_page_row_count=2,
+        journal=TomeJournalFs(path=path),
+    )
+    scribe.start()
+    for number in range(3):
+        scribe.concat(pd.DataFrame({"x": [number]}), f"key_{number}")
+        scribe.end_key()
+    assert len(os.listdir(path)) == 2
+
+    resumed_writer = FakeWriter()
+    resumed = create_scribe(
+        resumed_writer,
+        max_page_row_count=2,
+        journal=TomeJournalFs(path=path),
+    )
+    resumed.set_manifest_data(
+        merge_page_log(
+            writer.manifests[-1],
+            [{"id": writer.manifests[-1]["id"], "page": writer.manifest_pages[0]}],
+        )
+    )
+    assert resumed.get_journaled_keys() == ["key_2"]
+    resumed.start()
+    resumed.finish()
+
+    page, dataframe, keyset = resumed_writer.pages[0]
+    assert page["number"] == 1
+    assert keyset == ["key_2"]
+    assert list(dataframe["x"]) == [2]
+    assert not os.path.exists(path)
+
+
+def test_manifest_is_compacted_periodically():
+    writer = FakeWriter()
+    scribe = create_scribe(
+        writer, max_page_row_count=1, manifest_compaction_frequency=2
+    )
+
+    scribe.start()
+    for index in range(5):
+        scribe.concat(pd.DataFrame({"x": [index]}), f"key_{index}")
+    pages_per_manifest = [len(manifest["pages"]) for manifest in writer.manifests]
+    scribe.finish()
+
+    assert pages_per_manifest == [0, 2, 4]
+    assert [page["number"] for page in writer.manifest_pages] == [0, 2, 4]
+
+
+def test_cluster_by_orders_keys_of_a_page():
+    writer = FakeWriter()
+    scribe = create_scribe(writer, cluster_by=["map"])
+
+    scribe.start()
+    scribe.concat(pd.DataFrame({"map": ["b", "b"], "tick": [1, 2]}), "key_1")
+    scribe.concat(None, "key_2")
+    scribe.concat(pd.DataFrame({"map": ["c"], "tick": [3]}), "key_3")
+    scribe.concat(
+        pd.DataFrame({"map": ["a", "a"], "tick": [4, 5]}),
+        ["key_4", "key_5"],
+        key_rows=[(0, 1), (1, 2)],
+    )
+    scribe.concat(pd.DataFrame({"map": ["a", "b"], "tick": [6, 7]}), "key_6")
+    scribe.finish()
+
+    _, dataframe, keyset = writer.pages[0]
+    assert keyset == ["key_4", "key_5", "key_6", "key_1", "key_3", "key_2"]
+    assert list(dataframe["tick"]) == [4, 5, 6, 7, 1, 2, 3]
+    assert list(
+        writer.key_index[["row_start", "row_stop"]].itertuples(index=False, name=None)
+    ) == [(0, 1), (1, 2), (2, 4), (4, 6), (6, 7), (7, 7)]
+
+
+def test_journal_removes_chunks_with_background_write(tmp_path):
+    path = os.path.join(tmp_path, "journal")
+    scribe = create_scribe(
+        FakeWriter(),
+        max_page_row_count=1,
+        background_write=True,
+        journal=TomeJournalFs(path=path),
+    )
+
+    scribe.start()
+    for number in range(5):
+        scribe.concat(pd.DataFrame({"x": [number]}), f"key_{number}")
+        scribe.end_key()
+        scribe._writer.flush()  # pylint: disable=protected-access
+
+    # Only the chunk of the last page is left, it is committed after it
+    assert sorted(os.listdir(path)) == ["chunk_00000004.parquet", "journal.jsonl"]
+    scribe.finish()
+    assert not os.path.exists(path)
+
+
+def test_journal_skips_incomplete_key(tmp_path):
+    path = os.path.join(tmp_path, "journal")
+    crashed_writer = FakeWriter()
+    scribe = create_scribe(crashed_writer, journal=TomeJournalFs(path=path))
+    scribe.start()
+    scribe.concat(pd.DataFrame({"x": [0]}), "key_0")
+    scribe.end_key()
+    # A key cut off by the crash before all of its data was added
+    scribe.concat(pd.DataFrame({"x": [1]}), "key_1")
+
+    writer = FakeWriter()
+    resumed = create_scribe(writer, journal=TomeJournalFs(path=path))
+    resumed.set_manifest_data(crashed_writer.manifests[-1])
+    assert resumed.get_journaled_keys() == ["key_0"]
+    resumed.start()
+    resumed.finish()
+
+    _, dataframe, keyset = writer.pages[0]
+    assert keyset == ["key_0"]
+    assert list(dataframe["x"]) == [0]
@@ -0,0 +1,96 @@
+import math
+import pandas as pd
+from pandas.api import types
+
+
+def get_page_statistics(df, keyset):
+    """Row count, size and per-column min/max/null count for a page"""
+    return {
+        "rowCount": len(df),
+        "keyCount": len(keyset),
+        "memorySizeBytes": int(df.memory_usage(index=False).sum()),
+        "columns": {str(name): get_column_statistics(df[name]) for name in df.columns},
+    }
+
+
+def get_column_statistics(series):
+    statistics = {"nullCount": int(series.isna().sum())}
+    if not is_comparable(series):
+        return statistics
+    values = series.dropna()
+    if len(values) == 0:
+        return statistics
+    statistics["min"] = to_json_value(values.min())
+    statistics["max"] = to_json_value(values.max())
+    return statistics
+
+
+def is_comparable(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+    if types.is_bool_dtype(series) or types.is_numeric_dtype(series):
+        return True
+    if types.is_string_dtype(series):
+        return types.infer_dtype(series, skipna=True) == "string"
+    return False
+
+
+def to_json_value(value):
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+
+def page_may_match(page, filters):
+    """False only if the page statistics prove no row can match the filters.
+
+    filters use the pyarrow list format: a list of (column, op, value)
+    tuples that must all match, or a list of such lists where any may match.
+    """
+    statistics = page.get("statistics")
+    if filters is None or statistics is None:
+        return True
+    if not isinstance(filters, list) or len(filters) == 0:
+        return True
+    if isinstance(filters[0], tuple):
+        filters = [filters]
+    return any(
+        all(predicate_may_match(statistics, predicate) for predicate in conjunction)
+        for conjunction in filters
+    )
+
+
+# pylint: disable=too-many-return-statements
+def predicate_may_match(statistics, predicate):
+    column, op, value = predicate
+    column_statistics = statistics["columns"].get(column)
+    if column_statistics is None:
+        return True
+    if column_statistics["nullCount"] == statistics["rowCount"]:
+        return False
+    if "min" not in column_statistics or column_statistics.get("min") is None:
+        return True
+    low = column_statistics["min"]
+    high = column_statistics["max"]
+    try:
+        if op in ("==", "="):
+            return low <= value <= high
+        if op == "!=":
+            return not low == high == value
+        if op == "<":
+            return low < value
+        if op == "<=":
+            return low <= value
+        if op == ">":
+            return high > value
+        if op == ">=":
+            return high >= value
+        if op == "in":
+            return any(low <= item <= high for item in value)
+        if op == "not in":
+            return not (low == high and low in value)
+    except TypeError:
+        return True
+    return True
@@ -0,0 +1,48 @@
+# pylint: disable=missing-docstring
+import numpy as np
+import pandas as pd
+import rapidjson
+from .statistics import get_page_statistics, page_may_match
+
+
+def create_page():
+    df = pd.DataFrame(
+        {
+            "round": [1, 2, 3],
+            "value": [0.5, np.nan, 1.5],
+            "map_name": ["de_dust2", "de_dust2", "de_mirage"],
+            "empty": [None, None, None],
+            "flags": [[1], [2], [3]],
+        }
+    )
+    statistics = get_page_statistics(df, ["key_1", "key_2"])
+    return {"statistics": rapidjson.loads(rapidjson.dumps(statistics))}
+
+
+def test_get_page_statistics():
+    statistics = create_page()["statistics"]
+    assert statistics["rowCount"] == 3
+    assert statistics["keyCount"] == 2
+    assert statistics["memorySizeBytes"] > 0
+    assert statistics["columns"]["round"] == {"nullCount": 0, "min": 1, "max": 3}
+    assert statistics["columns"]["value"] == {"nullCount": 1, "min": 0.5, "max": 1.5}
+    assert statistics["columns"]["map_name"]["max"] == "de_mirage"
+    assert statistics["columns"]["empty"] == {"nullCount": 3}
+    assert statistics["columns"]["flags"] == {"nullCount": 0}
+
+
+def test_page_may_match():
+    page = create_page()
+    assert page_may_match(page, None)
+    assert page_may_match(page, [("round", "==", 2)])
+    assert not page_may_match(page, [("round", ">", 3)])
+    assert not page_may_match(page, [("round", "<", 1)])
+    assert not page_may_match(page, [("map_name", "in", ["de_nuke", "de_ancient"])])
+    assert page_may_match(page, [("map_name", "in", ["de_nuke", "de_inferno"])])
+    assert not page_may_match(page, [("empty", "==", 1)])
+    assert page_may_match(page, [("flags", "==", 1)])
+    assert page_may_match(page, [("missing", "==", 1)])
+    assert page_may_match(page, [("map_name", "==", 1)])
+    assert not page_may_match(page, [("round", "==", 2), ("value", ">", 2)])
+    assert page_may_match(page, [[("round", ">", 3)], [("value", "<", 1)]])
+    assert page_may_match({}, [("round", ">", 3)])
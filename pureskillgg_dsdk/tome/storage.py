@@ -0,0 +1,38 @@
+from .constants import is_s3_path, parse_s3_path
+from .writer_fs import TomeWriterFs
+from .writer_s3 import TomeWriterS3
+from .reader_fs import TomeReaderFs
+from .reader_s3 import TomeReaderS3
+
+
+def create_tome_writer(tome_collection_root_path, /, *, parquet_options=None, log=None):
+    """Writer for a local path or an s3://bucket/prefix path"""
+    if is_s3_path(tome_collection_root_path):
+        bucket, prefix = parse_s3_path(tome_collection_root_path)
+        return TomeWriterS3(
+            bucket=bucket, prefix=prefix, parquet_options=parquet_options, log=log
+        )
+    return TomeWriterFs(
+        root_path=tome_collection_root_path, parquet_options=parquet_options, log=log
+    )
+
+
+def create_tome_reader(
+    tome_collection_root_path, /, *, manifest_key, has_header=True, log=None
+):
+    """Reader for a local path or an s3://bucket/prefix path"""
+    if is_s3_path(tome_collection_root_path):
+        bucket, prefix = parse_s3_path(tome_collection_root_path)
+        return TomeReaderS3(
+            bucket=bucket,
+            prefix=prefix,
+            manifest_key=manifest_key,
+            has_header=has_header,
+            log=log,
+        )
+    return TomeReaderFs(
+        root_path=tome_collection_root_path,
+        manifest_key=manifest_key,
+        has_header=has_header,
+        log=log,
+    )
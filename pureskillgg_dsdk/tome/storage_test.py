@@ -0,0 +1,207 @@
+# pylint: disable=missing-docstring,invalid-name,protected-access
+# pylint: disable=unused-argument
+import os
+
+import pandas as pd
+from pyarrow import fs
+
+from .loader import TomeLoader
+from .manifest import TomeManifest
+from .scribe import TomeScribe
+from .reader_fs import TomeReaderFs
+from .reader_s3 import TomeReaderS3
+from .writer_s3 import TomeWriterS3
+from .storage import create_tome_writer, create_tome_reader
+from .constants import parse_s3_path
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+
+tome_name = "storage_test.1234-56-78,1234-56-78"
+
+
+class FakeS3Client:
+    class exceptions:  # pylint: disable=too-few-public-methods
+        class NoSuchKey(Exception):
+            pass
+
+    def __init__(self, root_path):
+        self._root_path = root_path
+        self.uploads = []
+
+    def put_object(self, Bucket, Key, Body, ContentType):
+        self._write(Bucket, Key, Body)
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs, Config):
+        self.uploads.append((Key, ExtraArgs["ContentType"], Config))
+        self._write(Bucket, Key, Fileobj.read())
+
+    def get_object(self, Bucket, Key):
+        path = os.path.join(self._root_path, Bucket, Key)
+        if not os.path.exists(path):
+            raise self.exceptions.NoSuchKey(Key)
+        with open(path, "rb") as file:
+            return {"Body": _Body(file.read())}
+
+    def delete_objects(self, Bucket, Delete):
+        for entry in Delete["Objects"]:
+            path = os.path.join(self._root_path, Bucket, entry["Key"])
+            if os.path.exists(path):
+                os.remove(path)
+
+    def get_paginator(self, operation_name):
+        return _Paginator(self._root_path)
+
+    def _write(self, bucket, key, body):
+        path = os.path.join(self._root_path, bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(body)
+
+
+class _Paginator:
+    def __init__(self, root_path):
+        self._root_path = root_path
+
+    def paginate(self, Bucket, Prefix):
+        folder = os.path.join(self._root_path, Bucket, Prefix)
+        if not os.path.isdir(folder):
+            return [{}]
+        keys = [Prefix + name for name in sorted(os.listdir(folder))]
+        return [{"Contents": [{"Key": key} for key in keys]}]
+
+
+class _Body:
+    def __init__(self, body):
+        self._body = body
+
+    def read(self):
+        return self._body
+
+
+def create_s3_reader(tmp_path, s3_client):
+    reader = TomeReaderS3(
+        bucket="some-bucket",
+        prefix="tomes",
+        manifest_key="/".join(["tome", "csds", tome_name, "tome"]),
+        filesystem=fs.SubTreeFileSystem(str(tmp_path), fs.LocalFileSystem()),
+    )
+    reader._s3_client = s3_client
+    reader.header._s3_client = s3_client
+    return reader
+
+
+def test_parse_s3_path():
+    assert parse_s3_path("s3://some-bucket") == ("some-bucket", None)
+    assert parse_s3_path("s3://some-bucket/tomes/v1/") == ("some-bucket", "tomes/v1")
+
+
+def test_storage_is_chosen_by_path(tmp_path):
+    writer = create_tome_writer("s3://some-bucket/tomes")
+    reader = create_tome_reader("s3://some-bucket/tomes", manifest_key="tome/a/tome")
+    assert isinstance(writer, TomeWriterS3)
+    assert isinstance(reader, TomeReaderS3)
+    assert isinstance(create_tome_reader(str(tmp_path), manifest_key="a"), TomeReaderFs)
+
+
+def test_s3_round_trip(tmp_path):
+    s3_client = FakeS3Client(str(tmp_path))
+    writer = TomeWriterS3(bucket="some-bucket", prefix="tomes")
+    writer._s3_client = s3_client
+    manifest = TomeManifest(tome_name=tome_name, ds_type="csds")
+    scribe = TomeScribe(manifest=manifest, writer=writer, max_page_row_count=2)
+
+    reader = create_s3_reader(tmp_path, s3_client)
+    assert reader.exists is False
+
+    scribe.start()
+    for index in range(3):
+        scribe.concat(pd.DataFrame({"x": [index, index], "y": ["a", "b"]}), index)
+    assert len(create_s3_reader(tmp_path, s3_client).read_manifest()["pages"]) == 3
+    scribe.finish()
+
+    loader = TomeLoader(reader=create_s3_reader(tmp_path, s3_client))
+    assert loader.exists is True
+    assert loader.is_complete is True
+    assert loader.get_keyset() == [0, 1, 2]
+    assert list(loader.get_dataframe()["x"]) == [0, 0, 1, 1, 2, 2]
+    assert (
+        s3_client.uploads[0][0]
+        == "tomes/" + manifest.get()["pages"][0]["dataframe"]["key"]
+    )
+    assert s3_client.uploads[0][1] == "application/x-parquet"
+
+    writer.remove_entries([manifest.get()["pages"][0]["dataframe"]])
+    assert not os.path.exists(
+        os.path.join(tmp_path, "some-bucket", s3_client.uploads[0][0])
+    )
+
+
+def test_fs_page_log(tmp_path):
+    writer = create_tome_writer(str(tmp_path))
+    manifest = TomeManifest(tome_name=tome_name, ds_type="csds")
+    scribe = TomeScribe(manifest=manifest, writer=writer, max_page_row_count=2)
+    manifest_key = manifest.get()["key"]
+    reader = create_tome_reader(str(tmp_path), manifest_key=manifest_key)
+    page_log_path = os.path.join(tmp_path, manifest_key + ".pages.jsonl")
+
+    scribe.start()
+    for index in range(3):
+        scribe.concat(pd.DataFrame({"x": [index, index]}), index)
+    with open(page_log_path, "a", encoding="utf-8") as file:
+        file.write('{"id": "cut off')
+
+    assert [page["number"] for page in reader.read_manifest()["pages"]] == [0, 1, 2]
+    assert not os.path.exists(os.path.join(tmp_path, manifest_key + ".tmp"))
+
+    scribe.finish()
+    assert not os.path.exists(page_log_path)
+    assert reader.read_manifest()["isComplete"] is True
+    assert len(reader.read_manifest()["pages"]) == 3
+
+
+def test_fs_page_log_appends_after_truncated_line(tmp_path):
+    writer = create_tome_writer(str(tmp_path))
+    manifest = TomeManifest(tome_name=tome_name, ds_type="csds")
+    scribe = TomeScribe(manifest=manifest, writer=writer, max_page_row_count=2)
+    manifest_key = manifest.get()["key"]
+    reader = create_tome_reader(str(tmp_path), manifest_key=manifest_key)
+    page_log_path = os.path.join(tmp_path, manifest_key + ".pages.jsonl")
+
+    scribe.start()
+    scribe.concat(pd.DataFrame({"x": [0, 0]}), 0)
+    scribe.concat(pd.DataFrame({"x": [1, 1]}), 1)
+    with open(page_log_path, "a", encoding="utf-8") as file:
+        file.write('{"id": "cut off')
+    for index in range(2, 4):
+        scribe.concat(pd.DataFrame({"x": [index, index]}), index)
+
+    pages = reader.read_manifest()["pages"]
+    assert [page["number"] for page in pages] == [0, 1, 2, 3]
+
+
+def test_s3_page_log_is_removed(tmp_path):
+    s3_client = FakeS3Client(str(tmp_path))
+    writer = TomeWriterS3(bucket="some-bucket", prefix="tomes")
+    writer._s3_client = s3_client
+    manifest = TomeManifest(tome_name=tome_name, ds_type="csds")
+    scribe = TomeScribe(
+        manifest=manifest,
+        writer=writer,
+        max_page_row_count=2,
+        manifest_compaction_frequency=2,
+    )
+    page_log_path = os.path.join(
+        tmp_path, "some-bucket", "tomes", manifest.get()["key"] + ".pages"
+    )
+
+    scribe.start()
+    for index in range(3):
+        scribe.concat(pd.DataFrame({"x": [index, index]}), index)
+    # Page 1 rewrote the manifest, so only page 2 is left in the log
+    assert os.listdir(page_log_path) == ["page_00002.json"]
+    reader = create_s3_reader(tmp_path, s3_client)
+    assert [page["number"] for page in reader.read_manifest()["pages"]] == [0, 1, 2]
+
+    scribe.finish()
+    assert os.listdir(page_log_path) == []
+    assert len(create_s3_reader(tmp_path, s3_client).read_manifest()["pages"]) == 3
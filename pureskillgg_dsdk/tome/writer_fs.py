@@ -5,7 +5,8 @@ import structlog
 import rapidjson
 import pandas as pd
 
-from .constants import get_page_path_fs
+from .parquet_options import get_parquet_write_kwargs
+from .constants import get_page_path_fs, get_page_log_key, create_page_log_entry
 
 
 class TomeWriterFs:
@@ -14,6 +15,7 @@ class TomeWriterFs:
         *,
         root_path,
         prefix=None,
+        parquet_options=None,
         log=None,
     ):
         self._log = log if log is not None else structlog.get_logger()
@@ -24,7 +26,11 @@ class TomeWriterFs:
         )
         self._root_path = root_path
         self._prefix = prefix
-        self._parquet_compression = "gzip"
+        self._parquet_options = parquet_options
+
+    def set_parquet_options(self, parquet_options):
+        """Parquet settings used for the pages written next"""
+        self._parquet_options = parquet_options
 
     def write_manifest(self, manifest):
         file_location = os.path.join(
@@ -34,12 +40,47 @@ class TomeWriterFs:
         self._log.info("Write Manifest: Start")
 
         self._write_json(file_location, manifest)
+        # The manifest now holds every logged page
+        self._remove_page_log(manifest)
 
-    def write_page(self, page, dataframe, keyset):
+    def write_manifest_page(self, manifest, page):
+        """Append a written page to the page log of the manifest"""
+        file_location = self._get_page_log_path(manifest)
+        ensure_dir(file_location)
+        self._log.info("Write Manifest Page: Start", page_number=page["number"])
+        line = (rapidjson.dumps(create_page_log_entry(manifest, page)) + "\n").encode()
+        with open(file_location, "ab+") as file:
+            # Do not append to a line cut off by a crash
+            if file.tell() > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b"\n":
+                    line = b"\n" + line
+            file.write(line)
+
+    def write_page(self, page, dataframe, keyset, key_rows=None):
         ensure_dir(self._get_page_key("dataframe", page))
         self._log.info("Write Page Start", page_number=page["number"])
         self._write_dataframe(page, dataframe)
-        self._write_keyset(page, keyset)
+        self._write_keyset(page, keyset, key_rows)
+
+    def write_key_index(self, key_index, df):
+        key = self._get_key(key_index)
+
+        content_type = key_index["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unsupported content type {content_type}")
+
+        ensure_dir(key)
+        self._log.info("Write Key Index: Start")
+        self._write_parquet(key, df)
+
+    def remove_entries(self, entries):
+        """Remove the objects of manifest entries, e.g. replaced pages"""
+        for entry in entries:
+            key = self._get_key(entry)
+            if os.path.exists(key):
+                self._log.debug("Remove", key=key)
+                os.remove(key)
 
     def _write_dataframe(self, page, dataframe):
         key = self._get_page_key("dataframe", page)
@@ -51,7 +92,7 @@ class TomeWriterFs:
         self._log.info("Write Dataframe: Start", page_number=page["number"])
         self._write_parquet(key, dataframe)
 
-    def _write_keyset(self, page, keyset):
+    def _write_keyset(self, page, keyset, key_rows):
         key = self._get_page_key("keyset", page)
 
         content_type = page["keyset"]["contentType"]
@@ -62,18 +103,38 @@ class TomeWriterFs:
         df = pd.DataFrame(
             keyset, columns=["_"]
         )  # must have string column name for parquet
+        if key_rows is not None:
+            df["row_start"] = [row_start for row_start, _ in key_rows]
+            df["row_stop"] = [row_stop for _, row_stop in key_rows]
         self._write_parquet(key, df)
 
     def _get_page_key(self, subtype, page):
         return get_page_path_fs(self._root_path, subtype, page)
 
+    def _get_key(self, entry):
+        return os.path.join(self._root_path, entry["key"])
+
     def _write_parquet(self, key: str, df: pd.DataFrame) -> None:
         self._log.debug("Write parquet", key=key)
-        df.to_parquet(key, compression=self._parquet_compression)
+        df.to_parquet(key, **get_parquet_write_kwargs(self._parquet_options))
 
     def _write_json(self, key, data):
-        with open(key, "w", encoding="utf-8") as file:
+        # Replace the file at once so readers never see a partial manifest
+        temp_key = f"{key}.tmp"
+        with open(temp_key, "w", encoding="utf-8") as file:
             rapidjson.dump(data, file)
+        os.replace(temp_key, key)
+
+    def _get_page_log_path(self, manifest):
+        return os.path.join(
+            self._root_path,
+            add_prefix(get_page_log_key(manifest["key"]) + ".jsonl", self._prefix),
+        )
+
+    def _remove_page_log(self, manifest):
+        file_location = self._get_page_log_path(manifest)
+        if os.path.exists(file_location):
+            os.remove(file_location)
 
 
 def add_prefix(key, prefix, /) -> str:
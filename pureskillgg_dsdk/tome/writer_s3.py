@@ -0,0 +1,189 @@
+from io import BytesIO
+
+import structlog
+import rapidjson
+import boto3
+from boto3.s3.transfer import TransferConfig
+import pandas as pd
+
+from .parquet_options import get_parquet_write_kwargs
+from .constants import (
+    get_page_key_s3,
+    add_s3_prefix,
+    get_page_log_key,
+    create_page_log_entry,
+)
+from .manifest import content_name
+
+MB = 1024 * 1024
+
+
+class TomeWriterS3:
+    def __init__(
+        self,
+        *,
+        bucket,
+        prefix=None,
+        multipart_chunksize_mb=16,
+        max_concurrency=8,
+        parquet_options=None,
+        log=None,
+    ):
+        self._log = log if log is not None else structlog.get_logger()
+        self._log = self._log.bind(
+            client="tome_writer_s3",
+            bucket=bucket,
+            prefix=prefix,
+        )
+        self._bucket = bucket
+        self._prefix = prefix
+        self._s3_client = boto3.client("s3")
+        self._transfer_config = TransferConfig(
+            multipart_threshold=multipart_chunksize_mb * MB,
+            multipart_chunksize=multipart_chunksize_mb * MB,
+            max_concurrency=max_concurrency,
+        )
+        self._parquet_options = parquet_options
+        # Number of pages whose page log objects were removed, by manifest key
+        self._removed_page_log_counts = {}
+
+    def set_parquet_options(self, parquet_options):
+        """Parquet settings used for the pages written next"""
+        self._parquet_options = parquet_options
+
+    def write_manifest(self, manifest):
+        key = add_s3_prefix(manifest["key"], self._prefix)
+        self._log.info("Write Manifest: Start")
+
+        self._s3_client.put_object(
+            Bucket=self._bucket,
+            Key=key,
+            Body=rapidjson.dumps(manifest).encode("utf-8"),
+            ContentType="application/json",
+        )
+        self._remove_page_log(manifest)
+
+    def write_manifest_page(self, manifest, page):
+        """Write a written page as its own object under the page log prefix"""
+        key = self._get_page_log_entry_key(manifest, page["number"])
+        self._log.info("Write Manifest Page: Start", page_number=page["number"])
+        self._s3_client.put_object(
+            Bucket=self._bucket,
+            Key=key,
+            Body=rapidjson.dumps(create_page_log_entry(manifest, page)).encode("utf-8"),
+            ContentType="application/json",
+        )
+
+    def write_page(self, page, dataframe, keyset, key_rows=None):
+        self._log.info("Write Page Start", page_number=page["number"])
+        self._write_dataframe(page, dataframe)
+        self._write_keyset(page, keyset, key_rows)
+
+    def write_key_index(self, key_index, df):
+        key = self._get_key(key_index)
+
+        content_type = key_index["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unsupported content type {content_type}")
+
+        self._log.info("Write Key Index: Start")
+        self._write_parquet(key, df, content_type)
+
+    def remove_entries(self, entries):
+        """Remove the objects of manifest entries, e.g. replaced pages"""
+        self._delete_keys([self._get_key(entry) for entry in entries])
+
+    def _delete_keys(self, keys):
+        # delete_objects takes at most 1000 keys per request
+        for start in range(0, len(keys), 1000):
+            self._log.debug("Remove", key_count=len(keys[start : start + 1000]))
+            self._s3_client.delete_objects(
+                Bucket=self._bucket,
+                Delete={
+                    "Objects": [{"Key": key} for key in keys[start : start + 1000]],
+                    "Quiet": True,
+                },
+            )
+
+    def _write_dataframe(self, page, dataframe):
+        key = self._get_page_key("dataframe", page)
+
+        content_type = page["dataframe"]["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unsupported content type {content_type}")
+
+        self._log.info("Write Dataframe: Start", page_number=page["number"])
+        self._write_parquet(key, dataframe, content_type)
+
+    def _write_keyset(self, page, keyset, key_rows):
+        key = self._get_page_key("keyset", page)
+
+        content_type = page["keyset"]["contentType"]
+        if content_type != "application/x-parquet":
+            raise Exception(f"Unsupported content type {content_type}")
+
+        self._log.info("Write keyset: Start", page_number=page["number"])
+        df = pd.DataFrame(
+            keyset, columns=["_"]
+        )  # must have string column name for parquet
+        if key_rows is not None:
+            df["row_start"] = [row_start for row_start, _ in key_rows]
+            df["row_stop"] = [row_stop for _, row_stop in key_rows]
+        self._write_parquet(key, df, content_type)
+
+    def _remove_page_log(self, manifest):
+        """Remove the page log objects of the pages now in the manifest"""
+        page_count = len(manifest["pages"])
+        if manifest.get("isComplete", False):
+            # Also removes objects left by earlier builds of the tome
+            prefix = add_s3_prefix(get_page_log_key(manifest["key"]), self._prefix)
+            paginator = self._s3_client.get_paginator("list_objects_v2")
+            keys = [
+                item["Key"]
+                for response in paginator.paginate(
+                    Bucket=self._bucket, Prefix=prefix + "/"
+                )
+                for item in response.get("Contents", [])
+            ]
+        else:
+            keys = [
+                self._get_page_log_entry_key(manifest, number)
+                for number in range(
+                    self._removed_page_log_counts.get(manifest["key"], 0), page_count
+                )
+            ]
+        self._removed_page_log_counts[manifest["key"]] = page_count
+        if len(keys) > 0:
+            self._log.info("Remove Page Log: Start", key_count=len(keys))
+            self._delete_keys(keys)
+
+    def _get_page_log_entry_key(self, manifest, page_number):
+        return add_s3_prefix(
+            "/".join(
+                [
+                    get_page_log_key(manifest["key"]),
+                    content_name(page_number, "page") + ".json",
+                ]
+            ),
+            self._prefix,
+        )
+
+    def _get_page_key(self, subtype, page):
+        return get_page_key_s3(self._prefix, subtype, page)
+
+    def _get_key(self, entry):
+        return add_s3_prefix(entry["key"], self._prefix)
+
+    def _write_parquet(self, key: str, df: pd.DataFrame, content_type: str) -> None:
+        self._log.debug("Write parquet", key=key)
+        body = BytesIO()
+        df.to_parquet(body, **get_parquet_write_kwargs(self._parquet_options))
+        body.seek(0)
+        # Objects larger than the chunk size are uploaded in parallel parts
+        self._s3_client.upload_fileobj(
+            body,
+            self._bucket,
+            key,
+            ExtraArgs={"ContentType": content_type},
+            Config=self._transfer_config,
+        )